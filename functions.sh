@@ -137,9 +137,13 @@ pggb:
   threads: $threads
 runid: $runid
 input_sample: "$input_sample"
+pggb_cache_dir: "${pggb_cache_dir:-cache/pggb}"
 EOF
 
   # Run Snakemake with the defined configuration
+  # Communities run concurrently in the same working directory. Snakemake locks the input and output files of a run,
+  # not the whole directory, and keeps its metadata per output file, so runs of communities with disjoint files can
+  # share the directory while the lock still stops two runs of the same community
   snakemake -p --forcerun --cores "$threads" --configfile "$CONFIG_FILE"
 
   local exit_code=$?
@@ -153,8 +157,10 @@ function analyse_community {
   # Function to analyse a community in case of sequence partitioning
   # Parameters:
   #   $1: Community index
+  #   $2: Number of threads for this community [default: $threads]
 
   local i="$1"
+  local threads="${2:-$threads}"
 
   if [[ -z "$i" ]]; then
     echo "Error: Missing community index."
@@ -11,6 +11,8 @@ poa_parameters=""
 segment_length=10000
 threads=16
 multiple_chromosomes=0
+pggb_cache_dir="cache/pggb"
+memory=""
 
 # Output colours
 RED='\033[0;31m'
@@ -49,6 +51,14 @@ while [[ $# -gt 0 ]]; do
       threads="$2"
       shift 2
       ;;
+    -c|--cache-dir)
+      pggb_cache_dir="$2"
+      shift 2
+      ;;
+    -m|--memory)
+      memory="$2"
+      shift 2
+      ;;
     -r|--runid)
       runid="$2"
       shift 2
@@ -81,7 +91,9 @@ if [[ -z "$input_sample" ]]; then
     echo -e "\t-p --percent-identity\t\tThe lowest similarity between all sequences in percentages [default: 95]\n"
     echo -e "\t-poa --poa-parameters\t\tThe partial order alignment parameters to use (asm5, asm10, asm20)\n"
     echo -e "\t-s --segment-length\t\tSegment length for mapping [default: 10k]\n"
-    echo -e "\t-t --threads\t\t\tNumber of threads to use [default: 16]\n"
+    echo -e "\t-t --threads\t\t\tNumber of threads to use, shared by the communities [default: 16]\n"
+    echo -e "\t-m --memory\t\t\tMemory in GB shared by the communities [default: all memory of the machine]\n"
+    echo -e "\t-c --cache-dir\t\t\tDirectory to cache pggb output in, unchanged runs are reused [default: cache/pggb]\n"
     exit 1
 fi
 
@@ -106,6 +118,11 @@ if [[ $threads -le 0 ]]; then
   exit 1
 fi
 
+if [[ ! -z "$memory" && ! "$memory" =~ ^[0-9]*\.?[0-9]+$ ]]; then
+  echo -e "${RED}Error${NC}: Memory should be a number of GB, e.g. 64 or 7.5."
+  exit 1
+fi
+
 
 
 
@@ -137,6 +154,7 @@ echo "POA Parameters: $poa_parameters"
 echo "Segment Length: $segment_length"
 echo "Threads: $threads"
 echo "RunID: $runid"
+echo "PGGB cache: $pggb_cache_dir"
 echo -e "Input Sample: ${input_sample}${NC}"
 
 
@@ -184,18 +202,90 @@ if [[ $multiple_chromosomes == 1 ]]; then
   export segment_length
   export threads
   export runid
+  export pggb_cache_dir
   export input_sample
   export input_dir
   export seqpart_dir
 
-  for i in $(seq 0 $(($ncommunities - 1))); do
-    analyse_community ${i}
+  # Estimate the cost of every community and plan the thread allocation and launch order
+  preflight_dir="output/${runid}/preflight/"
+  python3 scripts/preflight.py schedule ${seqpart_dir} -t ${threads} ${memory:+-m ${memory}} -o ${preflight_dir}
+
+  # Run the communities in the order of the schedule, as many at a time as the threads and memory allow
+  declare -A job_threads job_memory job_community
+  used_threads=0
+  used_memory=0
+  failed_communities=0
+
+  function wait_for_community {
+    local finished_pid pid status=0
+    if (( BASH_VERSINFO[0] > 5 || (BASH_VERSINFO[0] == 5 && BASH_VERSINFO[1] >= 1) )); then
+      wait -n -p finished_pid || status=$?
+    else
+      # wait -p needs bash 5.1; poll for a finished community instead, communities run for minutes to hours
+      while [ -z "$finished_pid" ]; do
+        for pid in "${!job_threads[@]}"; do
+          if ! kill -0 "$pid" 2> /dev/null; then
+            finished_pid=$pid
+            break
+          fi
+        done
+        [ -n "$finished_pid" ] || sleep 1
+      done
+      wait "$finished_pid" || status=$?
+    fi
+
+    if (( status == 0 )); then
+      echo "Community ${job_community[$finished_pid]} finished"
+    else
+      echo -e "${RED}Error${NC}: community ${job_community[$finished_pid]} failed, see output/${runid}/community${job_community[$finished_pid]}/analyse.log"
+      failed_communities=$((failed_communities + 1))
+    fi
+    used_threads=$((used_threads - job_threads[$finished_pid]))
+    used_memory=$((used_memory - job_memory[$finished_pid]))
+    unset "job_threads[$finished_pid]" "job_memory[$finished_pid]"
+  }
+
+  memory_budget=$(awk -v memory="${memory:-0}" 'BEGIN {print int(memory * 1024)}')
+  if (( memory_budget == 0 )); then
+    memory_budget=$(awk '/MemTotal/ {print int($2 / 1024)}' /proc/meminfo)
+  fi
+
+  while IFS=$'\t' read -r i community community_threads community_memory rest; do
+    while (( ${#job_threads[@]} > 0 )) && \
+        (( used_threads + community_threads > threads || used_memory + community_memory > memory_budget )); do
+      wait_for_community
+    done
+
+    echo "Starting community ${i} with ${community_threads} threads"
+    analyse_community ${i} ${community_threads} > "output/${runid}/community${i}/analyse.log" 2>&1 &
+    job_threads[$!]=$community_threads
+    job_memory[$!]=$community_memory
+    job_community[$!]=$i
+    used_threads=$((used_threads + community_threads))
+    used_memory=$((used_memory + community_memory))
+  done < <(tail -n +2 ${preflight_dir}schedule.tsv)
+
+  while (( ${#job_threads[@]} > 0 )); do
+    wait_for_community
   done
 
+  if (( failed_communities > 0 )); then
+    echo -e "${RED}Error${NC}: ${failed_communities} communities failed."
+    exit 1
+  fi
+
 else  # No sequence partitioning, directly call the function
   run_snakemake $number_of_genomes $percent_identity $poa_parameters $segment_length $threads $runid $input_sample
 fi
 
+# Aggregate the resource usage of all rules and communities into one table and MultiQC report
+telemetry_dir="output/${runid}/telemetry"
+echo "Resource usage per community:"
+python3 scripts/telemetry.py "output/${runid}" -o "${telemetry_dir}/run_resource_usage.tsv"
+cp multiqc_config.yaml ${telemetry_dir}
+multiqc -f ${telemetry_dir} -o ${telemetry_dir} -n resource_usage_report.html
+
 echo -e  "${GREEN}Done! Results can be found in ${PWD}/output/${runid}${NC}"
 
 
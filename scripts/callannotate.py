@@ -0,0 +1,220 @@
+"""
+Variant calling and snpEff annotation of all samples, overlapped under a thread and memory budget.
+
+For every community*/Folac* sample directory this runs `vg call` on the sample's pack file and annotates the calls
+with snpEff. The snpEff output is piped through `grep -v intergenic_region` straight into the trimmed VCF, so the
+unfiltered annotation is never written. The samples run concurrently: a step only starts when its threads and memory
+fit in the remaining budget, so vg call of one sample overlaps with snpEff of others.
+
+Finished outputs are kept: a sample whose call, annotated or trimmed VCF already exists skips the steps before it.
+Outputs are written to a temporary file first, so an interrupted step never looks finished.
+
+Usage:
+    python3 callannotate.py VCF_FILE_PATTERN ANNOTATION_REFERENCE SNPEFF_JAR_PATH [-t 64] [-m 256]
+"""
+
+import os
+import sys
+import glob
+import asyncio
+import argparse
+import subprocess
+from contextlib import asynccontextmanager
+
+
+class ResourcePool:
+    """
+    A budget of threads and memory shared by all running steps. Requests larger than the whole
+    budget are capped at the budget, so they run on their own instead of waiting forever.
+    """
+
+    def __init__(self, threads: int, memory_gb: float):
+        self.threads = threads
+        self.memory_gb = memory_gb
+        self.free_threads = threads
+        self.free_memory_gb = memory_gb
+        self.condition = asyncio.Condition()
+
+    @asynccontextmanager
+    async def reserve(self, threads: int, memory_gb: float):
+        """Waits until the threads and memory are free and holds them for the duration of the block."""
+        threads = min(threads, self.threads)
+        memory_gb = min(memory_gb, self.memory_gb)
+
+        async with self.condition:
+            await self.condition.wait_for(
+                lambda: self.free_threads >= threads and self.free_memory_gb >= memory_gb)
+            self.free_threads -= threads
+            self.free_memory_gb -= memory_gb
+        try:
+            yield
+        finally:
+            async with self.condition:
+                self.free_threads += threads
+                self.free_memory_gb += memory_gb
+                self.condition.notify_all()
+
+
+def is_nonempty(path: str) -> bool:
+    """Equivalent of the shell test [ -s path ]."""
+    return os.path.isfile(path) and os.path.getsize(path) > 0
+
+
+def find_reference_path(community_dir: str, pattern: str) -> str:
+    """
+    Finds the name of the first graph path matching the pattern, like `grep pattern data.gfa | awk '{print $2}' | head -n1`.
+
+    Args:
+        community_dir (str): The community directory containing data.gfa.
+        pattern (str): grep pattern selecting the reference path.
+
+    Returns:
+        str: The path name, or an empty string if no line matches.
+    """
+    result = subprocess.run(['grep', '-m1', '-e', pattern, os.path.join(community_dir, 'data.gfa')],
+                            stdout=subprocess.PIPE, text=True)
+    fields = result.stdout.split()
+    return fields[1] if len(fields) > 1 else ''
+
+
+async def run_to_file(command: list, output_path: str, cwd: str):
+    """
+    Runs a command with its standard output written to a file. The file only appears under its
+    final name if the command succeeded.
+    """
+    tmp_path = output_path + '.tmp'
+    try:
+        with open(tmp_path, 'wb') as out_file:
+            process = await asyncio.create_subprocess_exec(*command, stdout=out_file, cwd=cwd)
+            exit_code = await process.wait()
+        if exit_code != 0:
+            raise RuntimeError(f"{command[0]} failed with exit code {exit_code} in {cwd}")
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+async def filter_to_file(command: list, output_path: str, cwd: str):
+    """
+    Runs a command and streams its standard output through `grep -v intergenic_region` into a file.
+    The file only appears under its final name if both processes succeeded.
+    """
+    tmp_path = output_path + '.tmp'
+    read_fd, write_fd = os.pipe()
+    try:
+        with open(tmp_path, 'wb') as out_file:
+            producer = await asyncio.create_subprocess_exec(*command, stdout=write_fd, cwd=cwd)
+            os.close(write_fd)
+            write_fd = None
+            grep = await asyncio.create_subprocess_exec('grep', '-v', 'intergenic_region', stdin=read_fd,
+                                                        stdout=out_file, cwd=cwd)
+            os.close(read_fd)
+            read_fd = None
+            producer_exit, grep_exit = await asyncio.gather(producer.wait(), grep.wait())
+
+        if producer_exit != 0:
+            raise RuntimeError(f"{command[0]} failed with exit code {producer_exit} in {cwd}")
+        if grep_exit > 1:  # grep exits with 1 if every line was filtered out
+            raise RuntimeError(f"grep failed with exit code {grep_exit} in {cwd}")
+        os.replace(tmp_path, output_path)
+    finally:
+        for fd in (read_fd, write_fd):
+            if fd is not None:
+                os.close(fd)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+async def process_sample(sample_dir: str, ref_path: str, args, pool: ResourcePool):
+    """
+    Calls, annotates and trims the variants of one sample, skipping steps whose output already exists.
+
+    Args:
+        sample_dir (str): The Folac sample directory containing aln.pack and index.xg.
+        ref_path (str): The graph path to call variants against.
+        args: The parsed command line arguments.
+        pool (ResourcePool): The shared thread and memory budget.
+    """
+    call_out = os.path.join(sample_dir, f"{ref_path}.vcf")
+    annotated_out = os.path.join(sample_dir, f"{ref_path}_annotated.vcf")
+    trimmed_out = os.path.join(sample_dir, f"{ref_path}_annotated_trimmed.vcf")
+
+    if not is_nonempty(call_out) and not is_nonempty(trimmed_out) and not is_nonempty(annotated_out):
+        async with pool.reserve(args.call_threads, args.call_memory):
+            print(f"Calling {ref_path} in {sample_dir}")
+            await run_to_file(['vg', 'call', 'index.xg', '-k', 'aln.pack', '-a', '-d', '1',
+                               '-t', str(args.call_threads), '-p', ref_path], call_out, sample_dir)
+
+    if not is_nonempty(trimmed_out):
+        if is_nonempty(annotated_out):
+            # Left over from an earlier run; only the trimming is missing
+            print(f"Trimming {annotated_out}")
+            await filter_to_file(['cat', os.path.basename(annotated_out)], trimmed_out, sample_dir)
+        else:
+            async with pool.reserve(args.snpeff_threads, args.snpeff_memory):
+                print(f"Annotating and trimming {call_out}")
+                await filter_to_file(['java', '-jar', f'-Xmx{args.snpeff_memory}G', args.snpeff_jar, 'ann',
+                                      args.annotation_ref, os.path.basename(call_out)], trimmed_out, sample_dir)
+
+    # Delete original and annotated VCF files
+    for path in (call_out, annotated_out):
+        if os.path.isfile(path):
+            os.remove(path)
+
+    print(f"Processed {ref_path} in {sample_dir}")
+
+
+async def run_all(args) -> int:
+    """
+    Processes all samples of all communities concurrently.
+
+    Returns:
+        int: The number of samples that failed.
+    """
+    pool = ResourcePool(args.threads, args.memory)
+    tasks = []
+    for community_dir in sorted(glob.glob('community*')):
+        print(f"Processing community: {community_dir}")
+        ref_path = find_reference_path(community_dir, args.vcf_pattern)
+        if not ref_path:
+            print(f"Skipping {community_dir}; no path found")
+            continue
+
+        for sample_dir in sorted(glob.glob(os.path.join(community_dir, 'Folac*'))):
+            tasks.append(asyncio.create_task(process_sample(sample_dir, ref_path, args, pool), name=sample_dir))
+
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+
+    failures = 0
+    for task, result in zip(tasks, results):
+        if isinstance(result, Exception):
+            failures += 1
+            print(f"Error: {task.get_name()}: {result}")
+
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Variant calling and snpEff annotation of all samples under a thread and memory budget.")
+    parser.add_argument('vcf_pattern', help="grep pattern selecting the reference path in data.gfa")
+    parser.add_argument('annotation_ref', help="snpEff annotation reference")
+    parser.add_argument('snpeff_jar', help="path to snpEff.jar")
+    parser.add_argument('-t', '--threads', dest='threads', type=int, default=64, help="total thread budget [default: 64]")
+    parser.add_argument('-m', '--memory', dest='memory', type=float, default=256, help="total memory budget in GB [default: 256]")
+    parser.add_argument('--call-threads', dest='call_threads', type=int, default=16, help="threads per vg call [default: 16]")
+    parser.add_argument('--call-memory', dest='call_memory', type=float, default=16, help="memory reserved per vg call in GB [default: 16]")
+    parser.add_argument('--snpeff-threads', dest='snpeff_threads', type=int, default=2, help="threads reserved per snpEff run [default: 2]")
+    parser.add_argument('--snpeff-memory', dest='snpeff_memory', type=int, default=64, help="Java heap per snpEff run in GB [default: 64]")
+    args = parser.parse_args()
+
+    failures = asyncio.run(run_all(args))
+    if failures:
+        print(f"{failures} sample(s) failed.")
+        sys.exit(1)
+
+    print("Process completed.")
+
+
+if __name__ == '__main__':
+    main()
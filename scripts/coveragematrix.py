@@ -0,0 +1,218 @@
+"""
+Sparse node x sample coverage matrix from vg pack depth tables.
+
+`vg pack -d` prints one line per graph base (seq.pos, node.id, node.offset, coverage). The `build` command streams
+that table for every sample of a community, in parallel across samples, and reduces it per node to the maximum depth,
+the summed depth and the number of covered bases. The result is one matrix per community, so presence/absence at any
+depth threshold can be recomputed with the `presence` command without running vg pack again.
+
+The matrix is stored as an .npz file in compressed sparse column layout (one column per sample):
+    samples         the sample names
+    sample_offsets  CSC offsets; sample j owns entries sample_offsets[j]:sample_offsets[j + 1] of the arrays below
+    node_ids        the nodes with coverage in the sample, sorted
+    max_depth       the highest depth on any base of the node
+    sum_depth       the summed depth over all bases of the node
+    bases           the number of bases of the node in the depth table
+
+Usage:
+    python3 coveragematrix.py build -x index.xg -N annotated_ids.txt -Q 20 -t 90 -o coverage.npz Folac*/aln.pack
+    python3 coveragematrix.py presence coverage.npz --min-depth 10 -o "{sample}/annotated_nodes.txt"
+"""
+
+import os
+import gzip
+import argparse
+import subprocess
+import concurrent.futures
+from typing import NamedTuple
+import numpy as np
+
+CHUNK_SIZE = 32 << 20  # Characters of the depth table parsed at once
+
+
+class CoverageMatrix(NamedTuple):
+    samples: np.ndarray
+    sample_offsets: np.ndarray
+    node_ids: np.ndarray
+    max_depth: np.ndarray
+    sum_depth: np.ndarray
+    bases: np.ndarray
+
+    def sample_nodes(self, sample: int, min_depth: float = 0) -> np.ndarray:
+        """Returns the nodes of a sample whose maximum depth is above min_depth."""
+        start, end = self.sample_offsets[sample], self.sample_offsets[sample + 1]
+        return self.node_ids[start:end][self.max_depth[start:end] > min_depth]
+
+
+def reduce_depth_table(stream) -> tuple:
+    """
+    Reduces a `vg pack -d` depth table to per-node depth statistics.
+
+    Args:
+        stream: A text stream of the depth table, with or without its header line.
+
+    Returns:
+        tuple: The covered node ids and, per node, the maximum depth, the summed depth and the number of bases.
+    """
+    max_depth = np.zeros(0, dtype=np.int64)
+    sum_depth = np.zeros(0, dtype=np.int64)
+    bases = np.zeros(0, dtype=np.int64)
+
+    while True:
+        lines = stream.readlines(CHUNK_SIZE)
+        if not lines:
+            break
+        if lines[0].startswith('seq.pos'):
+            lines = lines[1:]
+            if not lines:
+                continue
+
+        table = np.loadtxt(lines, dtype=np.int64, usecols=(1, 3), ndmin=2)
+        nodes, depth = table[:, 0], table[:, 1]
+
+        # Grow the per-node arrays to the largest node id seen so far
+        size = int(nodes.max()) + 1
+        if size > len(max_depth):
+            max_depth = np.concatenate([max_depth, np.zeros(size - len(max_depth), dtype=np.int64)])
+            sum_depth = np.concatenate([sum_depth, np.zeros(size - len(sum_depth), dtype=np.int64)])
+            bases = np.concatenate([bases, np.zeros(size - len(bases), dtype=np.int64)])
+
+        np.maximum.at(max_depth, nodes, depth)
+        sum_depth[:size] += np.bincount(nodes, weights=depth, minlength=size).astype(np.int64)
+        bases[:size] += np.bincount(nodes, minlength=size)
+
+    covered = np.flatnonzero(bases)
+    return covered, max_depth[covered], sum_depth[covered], bases[covered]
+
+
+def sample_coverage(input_path: str, xg_path: str = None, node_list: str = None, min_mapq: int = 0,
+                    threads: int = 1) -> tuple:
+    """
+    Computes the per-node depth statistics of one sample.
+
+    Args:
+        input_path (str): A vg .pack file, or a saved `vg pack -d` table (optionally gzipped).
+        xg_path (str): The graph index, required for .pack input.
+        node_list (str): File of node ids to restrict vg pack to (vg pack -N).
+        min_mapq (int): Minimum mapping quality counted by vg pack (vg pack -Q).
+        threads (int): Number of vg pack threads.
+
+    Returns:
+        tuple: The output of reduce_depth_table.
+    """
+    if not input_path.endswith('.pack'):
+        opener = gzip.open if input_path.endswith('.gz') else open
+        with opener(input_path, 'rt') as f:
+            return reduce_depth_table(f)
+
+    if xg_path is None:
+        raise ValueError(f"An xg index (-x) is needed to read {input_path}")
+
+    command = ['vg', 'pack', '-x', xg_path, '-i', input_path, '-d', '-Q', str(min_mapq), '-t', str(threads)]
+    if node_list:
+        command += ['-N', node_list]
+
+    with subprocess.Popen(command, stdout=subprocess.PIPE, text=True, bufsize=1 << 20) as process:
+        result = reduce_depth_table(process.stdout)
+
+    if process.returncode != 0:
+        raise RuntimeError(f"vg pack failed on {input_path} with exit code {process.returncode}")
+
+    return result
+
+
+def sample_name(input_path: str) -> str:
+    """Names a sample after the directory of its input file, e.g. Folac001 for Folac001/aln.pack."""
+    return os.path.basename(os.path.dirname(os.path.abspath(input_path)))
+
+
+def build_coverage_matrix(inputs: list, xg_path: str = None, node_list: str = None, min_mapq: int = 0,
+                          threads: int = 1, jobs: int = 1, names: list = None) -> CoverageMatrix:
+    """
+    Builds the coverage matrix of a set of samples, running the samples in parallel.
+
+    Args:
+        inputs (list): Per sample, a vg .pack file or a saved `vg pack -d` table.
+        xg_path (str): The graph index, required for .pack input.
+        node_list (str): File of node ids to restrict vg pack to (vg pack -N).
+        min_mapq (int): Minimum mapping quality counted by vg pack (vg pack -Q).
+        threads (int): Total number of threads, divided over the parallel samples.
+        jobs (int): Number of samples processed at the same time.
+        names (list): Sample names. Defaults to the directory name of each input.
+
+    Returns:
+        CoverageMatrix: One column per input, in input order.
+    """
+    jobs = max(1, min(jobs, len(inputs)))
+    threads_per_job = max(1, threads // jobs)
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(sample_coverage, path, xg_path, node_list, min_mapq, threads_per_job)
+                   for path in inputs]
+        results = [future.result() for future in futures]
+
+    sample_offsets = np.zeros(len(results) + 1, dtype=np.int64)
+    np.cumsum([len(result[0]) for result in results], out=sample_offsets[1:])
+
+    def column(i):
+        return np.concatenate([result[i] for result in results] + [np.zeros(0, dtype=np.int64)])
+
+    return CoverageMatrix(
+        samples=np.array(names or [sample_name(path) for path in inputs], dtype=str),
+        sample_offsets=sample_offsets,
+        node_ids=column(0),
+        max_depth=column(1),
+        sum_depth=column(2),
+        bases=column(3)
+    )
+
+
+def save_coverage_matrix(matrix: CoverageMatrix, matrix_path: str):
+    """Saves a coverage matrix as a compressed .npz file."""
+    np.savez_compressed(matrix_path, **matrix._asdict())
+
+
+def load_coverage_matrix(matrix_path: str) -> CoverageMatrix:
+    """Loads a coverage matrix saved with save_coverage_matrix."""
+    with np.load(matrix_path) as data:
+        return CoverageMatrix(**{field: data[field] for field in CoverageMatrix._fields})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sparse node x sample coverage matrix from vg pack depth tables.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help="build the coverage matrix of a community")
+    build_parser.add_argument('inputs', nargs='+', help="per sample, a vg .pack file or a saved vg pack -d table")
+    build_parser.add_argument('-x', '--xg', dest='xg', default=None, help="graph index, required for .pack input")
+    build_parser.add_argument('-N', '--node-list', dest='node_list', default=None, help="only compute the depth of these node ids")
+    build_parser.add_argument('-Q', '--min-mapq', dest='min_mapq', type=int, default=0, help="minimum mapping quality [default: 0]")
+    build_parser.add_argument('-t', '--threads', dest='threads', type=int, default=1, help="total number of vg pack threads [default: 1]")
+    build_parser.add_argument('-j', '--jobs', dest='jobs', type=int, default=4, help="number of samples processed in parallel [default: 4]")
+    build_parser.add_argument('-n', '--names', dest='names', nargs='+', default=None, help="sample names, one per input [default: the directory of each input]")
+    build_parser.add_argument('-o', '--output', dest='output', default='coverage.npz', help="output matrix [default: coverage.npz]")
+
+    presence_parser = subparsers.add_parser('presence', help="write the nodes above a depth threshold per sample")
+    presence_parser.add_argument('matrix', help="coverage matrix from the build command")
+    presence_parser.add_argument('-d', '--min-depth', dest='min_depth', type=float, default=10, help="a node is present if its depth is above this on any base [default: 10]")
+    presence_parser.add_argument('-o', '--output-pattern', dest='output_pattern', default='{sample}/annotated_nodes.txt', help="output file per sample [default: {sample}/annotated_nodes.txt]")
+
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        if args.names and len(args.names) != len(args.inputs):
+            parser.error("--names needs one name per input")
+        matrix = build_coverage_matrix(args.inputs, args.xg, args.node_list, args.min_mapq, args.threads, args.jobs,
+                                       args.names)
+        save_coverage_matrix(matrix, args.output)
+        print(f"Coverage of {len(np.unique(matrix.node_ids))} nodes in {len(matrix.samples)} samples: {args.output}")
+    elif args.command == 'presence':
+        matrix = load_coverage_matrix(args.matrix)
+        for i, sample in enumerate(matrix.samples):
+            output_path = args.output_pattern.format(sample=sample)
+            with open(output_path, 'w') as f:
+                f.write(''.join(f'{node_id}\n' for node_id in matrix.sample_nodes(i, args.min_depth)))
+
+
+if __name__ == '__main__':
+    main()
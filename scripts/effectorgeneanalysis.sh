@@ -9,8 +9,12 @@ if [ "$#" -ne 2 ]; then
 fi
 
 # Define paths to your data and scripts
-ID_EXTRACT_SCRIPT=$1
-NODE_TO_GENES_SCRIPT=$2
+# Resolve the scripts to absolute paths, since the loops below change directory
+ID_EXTRACT_SCRIPT=$(readlink -f "$1")
+NODE_TO_GENES_SCRIPT=$(readlink -f "$2")
+GENE_INDEX_SCRIPT="$(dirname "$NODE_TO_GENES_SCRIPT")/geneindex.py"
+COVERAGE_SCRIPT="$(dirname "$NODE_TO_GENES_SCRIPT")/coveragematrix.py"
+MIN_DEPTH=10
 INDEX_GIRAFFE="index.giraffe.gbz"
 INDEX_XG="index.xg"
 
@@ -25,16 +29,22 @@ for community_dir in ./community*; do
     vg view -aj "annotated.gam" > "annotated.json"
 
     # Extract node ids
-    python3 $ID_EXTRACT_SCRIPT < "annotated.json" > "annotated_ids.txt"
+    python3 $ID_EXTRACT_SCRIPT "annotated.json" -t 64 > "annotated_ids.txt"
+
+    # Index the genes to their nodes once, so each sample only needs a join against it
+    python3 $GENE_INDEX_SCRIPT "annotated.json" -n "nodes.csv" -o "gene_index.npz" -t 64
+
+    # Build the node x sample coverage matrix of all samples, then call node presence from it
+    # Presence at another depth threshold only needs the presence step, not vg pack
+    python3 $COVERAGE_SCRIPT build Folac*/aln.pack -x index.xg -N "annotated_ids.txt" -Q 20 -t 90 -j 6 -o "coverage.npz"
+    python3 $COVERAGE_SCRIPT presence "coverage.npz" --min-depth $MIN_DEPTH -o "{sample}/annotated_nodes.txt"
 
     # Apply the process to each Folac directory
     for folac_dir in Folac*; do
         echo "Processing $folac_dir..."
         cd $folac_dir
-        vg pack -x ../index.xg -i "aln.pack" -N "../annotated_ids.txt" -d -Q 20 -t 90 | awk '$4 > 10' | awk '{print $2}' | sort -u > "annotated_nodes.txt"
-
         # Convert the nodes to genes
-        python3 $NODE_TO_GENES_SCRIPT
+        python3 $NODE_TO_GENES_SCRIPT -i "../gene_index.npz" -n "annotated_nodes.txt"
         cd ..
     done
     cd ..
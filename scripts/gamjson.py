@@ -0,0 +1,137 @@
+"""
+Parallel reader for the JSON-lines output of `vg view -aj` (GAM as JSON).
+
+The file is split into byte ranges on line boundaries and every range is decoded in a separate
+process. Only the fields used downstream are kept:
+    name                                  -> GamRecords.names
+    path.mapping[].position.node_id       -> GamRecords.node_ids
+    sum of path.mapping[].edit[].to_length -> GamRecords.aligned_lengths
+
+Mappings are stored flat, with GamRecords.mapping_offsets marking where the mappings of each record start
+(record i owns mappings mapping_offsets[i]:mapping_offsets[i + 1]).
+"""
+
+import os
+import json
+import concurrent.futures
+from typing import NamedTuple, List, Tuple
+import numpy as np
+
+CHUNK_SIZE = 64 << 20  # Bytes of JSON decoded per task
+
+
+class GamRecords(NamedTuple):
+    names: List[str]
+    mapping_offsets: np.ndarray
+    node_ids: np.ndarray
+    aligned_lengths: np.ndarray
+
+    def record_index(self) -> np.ndarray:
+        """Returns the index of the record that each mapping belongs to."""
+        return np.repeat(np.arange(len(self.names)), np.diff(self.mapping_offsets))
+
+
+def chunk_ranges(json_path: str, chunk_count: int) -> List[Tuple[int, int]]:
+    """
+    Splits a JSON-lines file into byte ranges that start and end on line boundaries.
+
+    Args:
+        json_path (str): Path to the JSON-lines file.
+        chunk_count (int): The number of ranges to aim for.
+
+    Returns:
+        list: A list of (start, end) byte offsets covering the whole file.
+    """
+    file_size = os.path.getsize(json_path)
+    step = max(1, file_size // max(1, chunk_count))
+
+    boundaries = [0]
+    with open(json_path, 'rb') as f:
+        position = step
+        while position < file_size:
+            f.seek(position)
+            f.readline()  # Move to the start of the next line
+            boundary = f.tell()
+            if boundary >= file_size:
+                break
+            if boundary > boundaries[-1]:
+                boundaries.append(boundary)
+            position = boundary + step
+    boundaries.append(file_size)
+
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def parse_chunk(json_path: str, start: int, end: int) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Decodes the alignments in one byte range of a JSON-lines file.
+
+    Args:
+        json_path (str): Path to the JSON-lines file.
+        start (int): Byte offset of the first line in the range.
+        end (int): Byte offset just past the last line in the range.
+
+    Returns:
+        tuple: The record names, the number of mappings per record, and the node id and aligned length of every mapping.
+    """
+    with open(json_path, 'rb') as f:
+        f.seek(start)
+        lines = f.read(end - start).splitlines()
+
+    names = []
+    mapping_counts = []
+    node_ids = []
+    aligned_lengths = []
+    for line in lines:
+        if not line.strip():
+            continue
+
+        alignment = json.loads(line)
+        names.append(alignment.get('name', 'Unknown'))
+
+        count = 0
+        for mapping in alignment.get('path', {}).get('mapping', []):
+            node_id = mapping.get('position', {}).get('node_id')
+            if node_id is None:
+                continue
+            node_ids.append(int(node_id))
+            aligned_lengths.append(sum(edit.get('to_length', 0) for edit in mapping.get('edit', [])))
+            count += 1
+        mapping_counts.append(count)
+
+    return (names, np.array(mapping_counts, dtype=np.int64), np.array(node_ids, dtype=np.int64),
+            np.array(aligned_lengths, dtype=np.int64))
+
+
+def read_gam_json(json_path: str, threads: int = None) -> GamRecords:
+    """
+    Reads a `vg view -aj` JSON-lines file in parallel.
+
+    Args:
+        json_path (str): Path to the JSON-lines file.
+        threads (int): Number of worker processes. Defaults to the number of CPUs.
+
+    Returns:
+        GamRecords: The names, node ids and aligned lengths of all alignments, in file order.
+    """
+    threads = threads or os.cpu_count() or 1
+    chunk_count = max(threads, os.path.getsize(json_path) // CHUNK_SIZE + 1)
+    ranges = chunk_ranges(json_path, chunk_count)
+
+    if threads == 1 or len(ranges) == 1:
+        results = [parse_chunk(json_path, start, end) for start, end in ranges]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=threads) as executor:
+            results = list(executor.map(parse_chunk, [json_path] * len(ranges), *zip(*ranges)))
+
+    names = [name for result in results for name in result[0]]
+    mapping_counts = np.concatenate([result[1] for result in results] + [np.zeros(0, dtype=np.int64)])
+    mapping_offsets = np.zeros(len(mapping_counts) + 1, dtype=np.int64)
+    np.cumsum(mapping_counts, out=mapping_offsets[1:])
+
+    return GamRecords(
+        names=names,
+        mapping_offsets=mapping_offsets,
+        node_ids=np.concatenate([result[2] for result in results] + [np.zeros(0, dtype=np.int64)]),
+        aligned_lengths=np.concatenate([result[3] for result in results] + [np.zeros(0, dtype=np.int64)])
+    )
@@ -0,0 +1,143 @@
+"""
+Gene to node index of a community.
+
+`vg annotate` aligns every gene to the graph once per community, but the genes are looked up for every sample.
+This module turns the annotated alignments into a compact index once, so that each sample only needs a join of
+its present nodes against the index instead of a full parse of annotated.json.
+
+The index is stored as an .npz file with:
+    gene_ids         the gene names, in order of first appearance in annotated.json
+    gene_offsets     CSR offsets; gene i owns entries gene_offsets[i]:gene_offsets[i + 1] of the arrays below
+    node_ids         the distinct nodes each gene aligns to, sorted per gene
+    aligned_lengths  the nucleotides of the gene aligned to each of those nodes
+    node_lengths     the sequence length of every node, indexed by node id (0 if unknown)
+
+Usage:
+    python3 geneindex.py annotated.json -n nodes.csv -o gene_index.npz
+"""
+
+import sys
+import csv
+import argparse
+from typing import NamedTuple
+import numpy as np
+from gamjson import read_gam_json, GamRecords
+
+
+class GeneIndex(NamedTuple):
+    gene_ids: np.ndarray
+    gene_offsets: np.ndarray
+    node_ids: np.ndarray
+    aligned_lengths: np.ndarray
+    node_lengths: np.ndarray
+
+    def entry_genes(self) -> np.ndarray:
+        """Returns the gene index of every (gene, node) entry."""
+        return np.repeat(np.arange(len(self.gene_ids)), np.diff(self.gene_offsets))
+
+
+def load_node_lengths(nodes_csv: str) -> np.ndarray:
+    """
+    Loads the node lengths from the nodes.csv written by gfa.py.
+
+    Args:
+        nodes_csv (str): Path to the ';'-separated file of node names and sequences.
+
+    Returns:
+        numpy.ndarray: The length of every node, indexed by node id.
+    """
+    csv.field_size_limit(sys.maxsize)
+
+    node_ids = []
+    lengths = []
+    with open(nodes_csv, 'r') as csv_file:
+        reader = csv.reader(csv_file, delimiter=';')
+        next(reader)  # Skip header
+        for node_id, sequence in reader:
+            node_ids.append(int(node_id))
+            lengths.append(len(sequence))
+
+    node_lengths = np.zeros(max(node_ids, default=0) + 1, dtype=np.int64)
+    node_lengths[node_ids] = lengths
+    return node_lengths
+
+
+def build_gene_index(records: GamRecords, node_lengths: np.ndarray = None) -> GeneIndex:
+    """
+    Builds the gene to node index from the annotated alignments.
+
+    Args:
+        records (gamjson.GamRecords): The annotated alignments, one or more per gene.
+        node_lengths (numpy.ndarray): The length of every node, indexed by node id.
+
+    Returns:
+        GeneIndex: The index with one entry per distinct (gene, node) pair.
+    """
+    # Number the genes in order of first appearance; a gene can have several alignments
+    gene_index = {}
+    for name in records.names:
+        gene_index.setdefault(name, len(gene_index))
+    record_genes = np.array([gene_index[name] for name in records.names], dtype=np.int64)
+    mapping_genes = record_genes[records.record_index()]
+
+    # Merge all mappings of a gene onto the same node; the pairs come out sorted by gene, then node
+    pairs, inverse = np.unique(np.stack([mapping_genes, records.node_ids]), axis=1, return_inverse=True)
+    aligned_lengths = np.bincount(inverse.ravel(), weights=records.aligned_lengths, minlength=pairs.shape[1])
+
+    gene_offsets = np.zeros(len(gene_index) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(pairs[0], minlength=len(gene_index)), out=gene_offsets[1:])
+
+    return GeneIndex(
+        gene_ids=np.array(list(gene_index), dtype=str),
+        gene_offsets=gene_offsets,
+        node_ids=pairs[1],
+        aligned_lengths=aligned_lengths.astype(np.int64),
+        node_lengths=node_lengths if node_lengths is not None else np.zeros(0, dtype=np.int64)
+    )
+
+
+def save_gene_index(index: GeneIndex, index_path: str):
+    """Saves a gene index as an .npz file."""
+    np.savez(index_path, **index._asdict())
+
+
+def load_gene_index(index_path: str) -> GeneIndex:
+    """Loads a gene index saved with save_gene_index."""
+    with np.load(index_path) as data:
+        return GeneIndex(**{field: data[field] for field in GeneIndex._fields})
+
+
+def join_sample(index: GeneIndex, node_ids: np.ndarray):
+    """
+    Counts, per gene, the distinct present nodes the gene aligns to and the number of nucleotides aligned to them.
+
+    Args:
+        index (GeneIndex): The gene to node index of the community.
+        node_ids (numpy.ndarray): The ids of the nodes present in the sample.
+
+    Returns:
+        tuple: The node count per gene and the aligned length per gene, in the order of index.gene_ids.
+    """
+    present = np.isin(index.node_ids, node_ids)
+    entry_genes = index.entry_genes()[present]
+
+    node_counts = np.bincount(entry_genes, minlength=len(index.gene_ids))
+    aligned_lengths = np.bincount(entry_genes, weights=index.aligned_lengths[present],
+                                  minlength=len(index.gene_ids)).astype(np.int64)
+
+    return node_counts, aligned_lengths
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Builds the gene to node index of a community from vg annotate output.")
+    parser.add_argument('json_file', help="vg view -aj output of vg annotate")
+    parser.add_argument('-n', '--nodes-csv', dest='nodes_csv', default=None, help="nodes.csv written by gfa.py, for the node lengths")
+    parser.add_argument('-o', '--output', dest='output', default='gene_index.npz', help="output index [default: gene_index.npz]")
+    parser.add_argument('-t', '--threads', dest='threads', type=int, default=None, help="number of worker processes [default: all CPUs]")
+    args = parser.parse_args()
+
+    node_lengths = load_node_lengths(args.nodes_csv) if args.nodes_csv else None
+    index = build_gene_index(read_gam_json(args.json_file, args.threads), node_lengths)
+    save_gene_index(index, args.output)
+
+    print(f"Indexed {len(index.gene_ids)} genes over {len(np.unique(index.node_ids))} nodes: {args.output}")
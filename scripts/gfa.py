@@ -1,77 +1,225 @@
-import time
 import sys
+import time
+import argparse
 import numpy as np
-import pandas as pd
-import gfapy
-from gfa_utils import generate_matrix, node_position_handler, compute_coreness, compute_coreness_stats, create_heatmap
+from gfa_reader import GfaGraph, read_gfa, count_matrices, dense_matrix, column_totals, node_coreness, \
+    coreness_percentages
+from gfa_topology import write_topology_stats
+from heatmap_png import render_heatmap, write_png
+from path_index import CORENESS_CLASSES, build_path_index, save_path_index, write_coreness_tracks
+
+# Subcommands in the order in which "all" runs them. Only the interactive heatmap needs pandas and plotly, which are
+# imported when it is written, so every other subcommand runs on NumPy alone.
+COMMANDS = ['stats', 'matrix', 'positions', 'heatmap']
+
+# The interactive heatmap is only written below this number of cells; its file size grows with every cell
+HTML_MAX_CELLS = 100000
 
 
-def main(gfa_path, output_path):
+def write_stats(graph: GfaGraph, gfa_path: str, output_path: str, coreness_values: str = "copy_number"):
     """
-    This script reads a GFA file and generates a heatmap of the nodes and genomes.
-    It also outputs csv files containing the sequences of the nodes and the coreness statistics.
+    Writes the node traversal counts (copy_number.npz), the node sequences (nodes.csv), the coreness statistics
+    (coreness_stats.csv) and the topology statistics (topology_stats.csv, degree_distribution.csv).
 
     Args:
-        gfa_path (str): Path to the GFA file
+        graph (GfaGraph): The graph, read with sequences.
+        gfa_path (str): Path to the GFA file, of which the directory names the topology table row
+        output_path (str): Directory to write the output files to
+        coreness_values (str): "copy_number" to count the length of a node once for every time a path traverses it in
+                               the coreness statistics, or "presence" to count every node in a path once
+    """
+    np.savez_compressed(output_path + "copy_number.npz", **count_matrices(graph))
+
+    with open(output_path + "nodes.csv", 'w') as f:
+        f.write("name;sequence\n")
+        f.writelines(f"{node_id};{sequence}\n" for node_id, sequence in zip(graph.node_ids, graph.sequences))
+
+    percentages = coreness_percentages(graph, node_coreness(graph), copy_number=(coreness_values == "copy_number"))
+    with open(output_path + "coreness_stats.csv", 'w') as f:
+        f.write(','.join(['genome'] + CORENESS_CLASSES) + '\n')
+        f.writelines(','.join([name] + [str(value) for value in row]) + '\n'
+                     for name, row in zip(graph.path_names, percentages))
+
+    print("Computing topology statistics...")
+    write_topology_stats(gfa_path, output_path, graph=graph)
+
+
+def write_matrix(graph: GfaGraph, output_path: str, values: str = "presence"):
+    """
+    Writes the genome x node matrix (matrix.csv) of node presence, or of copy number.
+
+    Args:
+        graph (GfaGraph): The graph.
+        output_path (str): Directory to write the output files to
+        values (str): "presence" or "copy_number", the values of the matrix
+    """
+    matrix = dense_matrix(graph, values)
+    with open(output_path + "matrix.csv", 'w') as f:
+        f.write(';'.join(['genomes'] + list(graph.node_ids.astype(str))) + '\n')
+        f.writelines(name + ';' + ';'.join(row.astype(str)) + '\n' for name, row in zip(graph.path_names, matrix))
+
+
+def write_positions(graph: GfaGraph, output_path: str, window_size: int = 10000):
+    """
+    Writes the coordinate index of the paths (path_index/, see path_index.py) and the windowed coreness tracks of
+    every path (coreness_tracks/).
+
+    Args:
+        graph (GfaGraph): The graph.
+        output_path (str): Directory to write the output files to
+        window_size (int): Window size in bp of the coreness tracks
+    """
+    offsets = graph.path_offsets
+    path_steps = [graph.steps[offsets[i]:offsets[i + 1]] for i in range(len(graph.path_names))]
+    path_index = build_path_index(graph.path_names, path_steps, graph.lengths_by_id(), node_coreness(graph))
+    save_path_index(path_index, output_path + "path_index")
+
+    write_coreness_tracks(path_index, output_path + "coreness_tracks", window_size)
+
+
+def node_positions(graph: GfaGraph) -> tuple:
+    """
+    Computes the 1-based start and end position of every node in every path. For a node that a path traverses more
+    than once, the last traversal is used.
 
     Returns:
-        None
+        tuple: The genome x node start and end positions, and whether the node is in the path.
     """
+    lengths = graph.lengths_by_id()
+    step_paths = graph.step_paths()
+    step_ends = np.cumsum(lengths[graph.steps])
+    step_ends -= np.repeat(np.append(0, step_ends)[graph.path_offsets[:-1]], np.diff(graph.path_offsets))
 
-    st = time.time()
+    shape = (len(graph.path_names), len(graph.node_ids))
+    last_step = np.full(shape, -1, dtype=np.int64)
+    np.maximum.at(last_step, (step_paths, graph.steps - 1), np.arange(len(graph.steps)))
 
-    # Read GFA file
-    print("Reading GFA file...")
-    gfa = gfapy.Gfa.from_file(gfa_path)
+    present = last_step >= 0
+    ends = np.where(present, step_ends[last_step], 0)
+    starts = np.where(present, ends - lengths[graph.node_ids] + 1, 0)
+    return starts, ends, present
 
-    # Generate node presence matrix
-    print("Generating data...")
-    node_presence_matrix = generate_matrix(gfa)
-    node_presence_matrix.to_csv(output_path + "matrix.csv", sep=";")
 
-    # Get the total sum of columns
-    total_node_occurrence = np.sum(np.abs(node_presence_matrix), axis=0)
+def write_heatmap_html(graph: GfaGraph, output_path: str, matrix: np.ndarray, col_totals: np.ndarray):
+    """
+    Writes the interactive Plotly heatmap (heatmap.html), with the length, coreness and position of every node.
 
-    # Create a dataframe of all nodes and their sequence
-    segment_list = pd.DataFrame({'name': [int(s.name) for s in gfa.segments],
-                                 'sequence': [s.sequence for s in gfa.segments]})
-    segment_list.set_index('name', inplace=True)
+    Args:
+        graph (GfaGraph): The graph.
+        output_path (str): Directory to write the output files to
+        matrix (numpy.ndarray): The genome x node matrix of write_matrix
+        col_totals (numpy.ndarray): The column totals of the matrix
+    """
+    import pandas as pd
+    from gfa_utils import create_heatmap
 
-    # Output a csv of the nodes and their sequences
-    segment_list.to_csv(output_path + "nodes.csv", sep=';')
+    genomes = graph.path_names
+    nodes = list(graph.node_ids.astype(str))
+    coreness = pd.Series(np.array(CORENESS_CLASSES)[node_coreness(graph)[graph.node_ids]], index=nodes)
 
-    # Create a list of all the lengths of all the nodes in the gfa file
-    sequence_lengths = [len(sequence) for sequence in segment_list.sequence]
+    starts, ends, present = node_positions(graph)
+    start_pos_matrix, end_pos_matrix = (pd.DataFrame(positions, index=genomes, columns=graph.node_ids).astype('Int64')
+                                        .mask(~present) for positions in (starts, ends))
 
-    # Get the names of the genomes and the names of the nodes
-    genomes = gfa.path_names
-    nodes = gfa.segment_names
+    fig = create_heatmap(genomes, nodes, list(graph.node_lengths), pd.DataFrame(matrix, index=genomes, columns=nodes),
+                         list(col_totals), coreness, start_pos_matrix, end_pos_matrix)
+    fig.write_html(output_path + "heatmap.html")
 
-    # Calculate and save coreness
-    coreness = compute_coreness(total_node_occurrence, sequence_lengths, len(genomes))
-    coreness_stats = compute_coreness_stats(coreness, gfa, segment_list)
-    coreness_stats.to_csv(output_path + "coreness_stats.csv")
 
-    # Only execute this part if the dataset is small; File size of heatmap is pretty much directly correlated to this
-    if len(nodes)*len(genomes) < 100000:
+def write_heatmap(graph: GfaGraph, output_path: str, values: str = "presence"):
+    """
+    Writes the heatmap of the nodes and genomes as a static image (heatmap.png), which scales to any graph size, and
+    for small graphs as an interactive Plotly figure (heatmap.html).
 
-        # Create heatmap and save as HTML and PNG
-        print("Creating heatmap...")
+    Args:
+        graph (GfaGraph): The graph.
+        output_path (str): Directory to write the output files to
+        values (str): "presence" or "copy_number", the values of the heatmap
+    """
+    # One byte per cell; copy numbers above 127 get the colour of 127
+    col_totals = column_totals(graph, values)
+    write_png(output_path + "heatmap.png", render_heatmap(dense_matrix(graph, values, np.int8), col_totals, width=1800))
+
+    if len(graph.path_names) * len(graph.node_ids) < HTML_MAX_CELLS:
+        write_heatmap_html(graph, output_path, dense_matrix(graph, values), col_totals)
 
-        # Get node positions
-        start_pos_matrix, end_pos_matrix = node_position_handler(segment_list, gfa)
 
-        # Plot everything
-        fig = create_heatmap(genomes, nodes, sequence_lengths, node_presence_matrix, total_node_occurrence, coreness,
-                             start_pos_matrix, end_pos_matrix)
-        fig.write_html(output_path + "heatmap.html")
-        fig.write_image(output_path + "heatmap.png", width=1800)
+def main(gfa_path, output_path, values="presence", window_size=10000, commands=COMMANDS, coreness_values="copy_number"):
+    """
+    This script reads a GFA file and generates a heatmap of the nodes and genomes.
+    It also outputs csv files containing the sequences of the nodes, the coreness statistics and the topology
+    statistics, and a coordinate index of the paths (see path_index.py).
+
+    Args:
+        gfa_path (str): Path to the GFA file
+        output_path (str): Directory to write the output files to
+        values (str): "presence" to use node presence per genome, or "copy_number" to use the number of times each
+                      genome traverses a node, in the matrix and the heatmap
+        window_size (int): Window size in bp of the coreness tracks written to coreness_tracks/
+        commands (list): The outputs to write, any of COMMANDS
+        coreness_values (str): "copy_number" to weigh the nodes in the coreness statistics by the number of times each
+                               genome traverses them, or "presence" to count every node in a genome once
+
+    Returns:
+        None
+    """
+
+    st = time.time()
+
+    # Read GFA file; the sequences are only needed for nodes.csv
+    print("Reading GFA file...")
+    graph = read_gfa(gfa_path, sequences=('stats' in commands))
+
+    if 'stats' in commands:
+        print("Computing statistics...")
+        write_stats(graph, gfa_path, output_path, coreness_values)
+
+    if 'matrix' in commands:
+        print("Generating matrix...")
+        write_matrix(graph, output_path, values)
+
+    if 'positions' in commands:
+        # Index the node offsets of every path, to look up the nodes and coreness of any region of a genome
+        print("Indexing path positions...")
+        write_positions(graph, output_path, window_size)
+
+    if 'heatmap' in commands:
+        print("Creating heatmap...")
+        write_heatmap(graph, output_path, values)
 
     # Print execution time and number of nodes plotted
     et = time.time()
     elapsed_time = et - st
-    print(f"Done! \nExecution time: {str(elapsed_time)}\nNodes plotted: {str(len(nodes) * len(genomes))}")
+    print(f"Done! \nExecution time: {str(elapsed_time)}\nNodes plotted: {str(len(graph.node_ids) * len(graph.path_names))}")
 
 
 if __name__ == '__main__':
-    main(sys.argv[1], sys.argv[2])
+    parser = argparse.ArgumentParser(description="Computes node presence, coreness statistics and a heatmap of a GFA file.")
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('gfa_path', help="GFA file")
+    common.add_argument('output_path', help="output directory (with trailing slash)")
+    common.add_argument('--values', dest='values', choices=['presence', 'copy_number'], default='presence',
+                        help="use node presence or per-genome copy number for the matrix and heatmap [default: presence]")
+    common.add_argument('--coreness-values', dest='coreness_values', choices=['presence', 'copy_number'],
+                        default='copy_number',
+                        help="weigh the nodes in the coreness statistics by per-genome copy number, or count them once "
+                             "per genome [default: copy_number]")
+    common.add_argument('-w', '--window-size', dest='window_size', type=int, default=10000,
+                        help="window size in bp of the coreness tracks [default: 10000]")
+
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('stats', parents=[common],
+                          help="copy_number.npz, nodes.csv, coreness_stats.csv and the topology statistics")
+    subparsers.add_parser('matrix', parents=[common], help="matrix.csv")
+    subparsers.add_parser('positions', parents=[common], help="path_index/ and coreness_tracks/")
+    subparsers.add_parser('heatmap', parents=[common], help="heatmap.png, and heatmap.html for small graphs")
+    subparsers.add_parser('all', parents=[common], help="all of the above [default without a subcommand]")
+
+    # Without a subcommand, e.g. "gfa.py data.gfa output/", write everything as before
+    argv = sys.argv[1:]
+    if argv and argv[0] not in COMMANDS + ['all'] and not argv[0].startswith('-'):
+        argv.insert(0, 'all')
+    args = parser.parse_args(argv)
+
+    main(args.gfa_path, args.output_path, args.values, args.window_size,
+         COMMANDS if args.command == 'all' else [args.command], args.coreness_values)
@@ -0,0 +1,258 @@
+"""
+Lean GFA reader and node statistics on NumPy arrays.
+
+Only the S, P and L records are read, straight into arrays: no object is created per segment, step or link, and
+nothing heavier than NumPy is imported. The paths are stored flat, with GfaGraph.path_offsets marking where the steps
+of each path start (path i owns steps path_offsets[i]:path_offsets[i + 1]). Nodes are identified by their numeric
+segment name, and node columns in matrices are 0-based (column = node id - 1).
+
+Usage:
+    from gfa_reader import read_gfa
+    graph = read_gfa("data.gfa")
+
+The record parsers are checked with doctests, including records without the optional overlap field:
+    python3 -m doctest gfa_reader.py
+"""
+
+from array import array
+from typing import NamedTuple, List
+import numpy as np
+from path_index import CORENESS_CLASSES
+
+
+class GfaGraph(NamedTuple):
+    node_ids: np.ndarray
+    node_lengths: np.ndarray
+    sequences: List[str]
+    path_names: List[str]
+    path_offsets: np.ndarray
+    steps: np.ndarray
+    reverse: np.ndarray
+    link_sources: np.ndarray
+    link_targets: np.ndarray
+
+    def lengths_by_id(self) -> np.ndarray:
+        """Returns the length of every node, indexed by node id (0 for ids without a segment)."""
+        lengths = np.zeros(self.node_ids.max(initial=0) + 1, dtype=np.int64)
+        lengths[self.node_ids] = self.node_lengths
+        return lengths
+
+    def step_paths(self) -> np.ndarray:
+        """Returns the index of the path that each step belongs to."""
+        return np.repeat(np.arange(len(self.path_names)), np.diff(self.path_offsets))
+
+
+def parse_path(line: str) -> tuple:
+    """
+    Parses a P record. The overlap field is optional.
+
+    Returns:
+        tuple: The path name, the node id of every step and whether each step is in reverse.
+
+    >>> name, steps, reverse = parse_path('P\\tp1\\t1+,2-\\n')
+    >>> name, steps.tolist(), reverse.tolist()
+    ('p1', [1, 2], [False, True])
+    >>> parse_path('P\\tp1\\t1+,2-\\t*\\n')[1].tolist()
+    [1, 2]
+    """
+    name, steps = line.rstrip('\r\n').split('\t', 3)[1:3]
+    steps = steps.split(',')
+    return (name, np.array([step[:-1] for step in steps], dtype=np.int64),
+            np.fromiter((step[-1] == '-' for step in steps), dtype=bool, count=len(steps)))
+
+
+def parse_link(line: str) -> tuple:
+    """
+    Parses an L record into its source and target handles. The overlap field is optional.
+
+    >>> parse_link('L\\t1\\t+\\t2\\t-\\n'), parse_link('L\\t1\\t-\\t2\\t+\\t0M\\n')
+    ((0, 3), (1, 2))
+    """
+    _, source, source_orientation, target, target_orientation = line.rstrip('\r\n').split('\t', 5)[:5]
+    return 2 * (int(source) - 1) + (source_orientation == '-'), 2 * (int(target) - 1) + (target_orientation == '-')
+
+
+def read_gfa(gfa_path: str, sequences: bool = True) -> GfaGraph:
+    """
+    Reads the segments, paths and links of a GFA file.
+
+    Args:
+        gfa_path (str): The GFA file.
+        sequences (bool): Keep the segment sequences; without them only the lengths are kept.
+
+    Returns:
+        GfaGraph: The graph. Links are returned as oriented handles, 2 * (id - 1) for the forward and
+                  2 * (id - 1) + 1 for the reverse strand of a node.
+    """
+    # The segment names are the numeric node ids, so links are stored as handles straight away, in 8 bytes each
+    node_ids, node_lengths, node_sequences = array('q'), array('q'), []
+    path_names, path_steps, path_reverse = [], [], []
+    link_sources, link_targets = array('q'), array('q')
+
+    with open(gfa_path, 'r') as gfa_file:
+        for line in gfa_file:
+            record = line[:2]
+            if record == 'S\t':
+                fields = line.rstrip('\r\n').split('\t')
+                node_ids.append(int(fields[1]))
+                if fields[2] != '*':
+                    node_lengths.append(len(fields[2]))
+                else:
+                    ln_tags = [tag for tag in fields[3:] if tag.startswith('LN:i:')]
+                    node_lengths.append(int(ln_tags[0][5:]) if ln_tags else 0)
+                if sequences:
+                    node_sequences.append(fields[2])
+            elif record == 'P\t':
+                name, steps, reverse = parse_path(line)
+                path_names.append(name)
+                path_steps.append(steps)
+                path_reverse.append(reverse)
+            elif record == 'L\t':
+                source, target = parse_link(line)
+                link_sources.append(source)
+                link_targets.append(target)
+
+    path_offsets = np.zeros(len(path_names) + 1, dtype=np.int64)
+    np.cumsum([len(steps) for steps in path_steps], out=path_offsets[1:])
+
+    return GfaGraph(
+        node_ids=np.frombuffer(node_ids, dtype=np.int64),
+        node_lengths=np.frombuffer(node_lengths, dtype=np.int64),
+        sequences=node_sequences if sequences else None,
+        path_names=path_names,
+        path_offsets=path_offsets,
+        steps=np.concatenate(path_steps + [np.zeros(0, dtype=np.int64)]),
+        reverse=np.concatenate(path_reverse + [np.zeros(0, dtype=bool)]),
+        link_sources=np.frombuffer(link_sources, dtype=np.int64),
+        link_targets=np.frombuffer(link_targets, dtype=np.int64)
+    )
+
+
+def path_node_pairs(graph: GfaGraph) -> tuple:
+    """
+    Groups the steps by path and node.
+
+    Returns:
+        tuple: Per distinct (path, node) pair, sorted by path and node: the path index, the node id, the number of
+               forward and reverse traversals, and whether the last traversal in the path is in reverse.
+    """
+    span = graph.node_ids.max(initial=0) + 1
+    keys = graph.step_paths() * span + graph.steps
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+
+    first = np.flatnonzero(np.append(True, sorted_keys[1:] != sorted_keys[:-1])) if len(keys) else \
+        np.zeros(0, dtype=np.int64)
+    last = np.append(first[1:], len(keys)) - 1
+    reverse = graph.reverse[order].astype(np.int64)
+    reverse_counts = np.add.reduceat(reverse, first) if len(first) else np.zeros(0, dtype=np.int64)
+    forward_counts = (last - first + 1) - reverse_counts
+
+    pairs = sorted_keys[first]
+    return pairs // span, pairs % span, forward_counts, reverse_counts, reverse[last].astype(bool)
+
+
+def count_matrices(graph: GfaGraph) -> dict:
+    """
+    Builds the sparse node traversal count matrices of copy_number.npz.
+
+    The matrices have one row per path and one column per node and are stored in compressed sparse row layout:
+    row i owns entries indptr[i]:indptr[i + 1] of indices, forward and reverse. All three matrices share the same
+    sparsity pattern, so the total copy number is forward + reverse.
+
+    Returns:
+        dict: The path names, node names, indptr, indices (node id - 1) and the forward and reverse counts.
+    """
+    paths, nodes, forward, reverse, _ = path_node_pairs(graph)
+    indptr = np.zeros(len(graph.path_names) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(paths, minlength=len(graph.path_names)), out=indptr[1:])
+
+    return {
+        'path_names': np.array(graph.path_names, dtype=str),
+        'node_names': np.array([str(node_id) for node_id in graph.node_ids], dtype=str),
+        'indptr': indptr,
+        'indices': nodes - 1,
+        'forward': forward,
+        'reverse': reverse
+    }
+
+
+def dense_matrix(graph: GfaGraph, values: str = 'presence', dtype: type = np.int64) -> np.ndarray:
+    """
+    Builds the dense genome x node matrix of matrix.csv and the heatmap.
+
+    Args:
+        graph (GfaGraph): The graph.
+        values (str): "presence" for 1, or -1 if the last traversal of the node is in reverse, and 0 if absent;
+                      "copy_number" for the number of traversals.
+        dtype (type): The integer type of the matrix, e.g. np.int8 for the heatmap. Copy numbers above the maximum of
+                      the type are clipped.
+
+    Returns:
+        numpy.ndarray: One row per path and one column per node id - 1.
+    """
+    paths, nodes, forward, reverse, last_reverse = path_node_pairs(graph)
+    matrix = np.zeros((len(graph.path_names), len(graph.node_ids)), dtype=dtype)
+    if values == 'copy_number':
+        matrix[paths, nodes - 1] = np.minimum(forward + reverse, np.iinfo(dtype).max)
+    else:
+        matrix[paths, nodes - 1] = np.where(last_reverse, -1, 1)
+    return matrix
+
+
+def column_totals(graph: GfaGraph, values: str = 'presence') -> np.ndarray:
+    """
+    Sums the absolute values of every column of dense_matrix, without building the matrix or clipping.
+
+    Returns:
+        numpy.ndarray: Per node id - 1, the number of paths containing the node, or with values "copy_number" the
+                       number of traversals by all paths.
+    """
+    _, nodes, forward, reverse, _ = path_node_pairs(graph)
+    counts = forward + reverse if values == 'copy_number' else np.ones(len(nodes), dtype=np.int64)
+    return np.bincount(nodes - 1, weights=counts, minlength=len(graph.node_ids)).astype(np.int64)
+
+
+def node_coreness(graph: GfaGraph) -> np.ndarray:
+    """
+    Classifies every node by the number of paths it occurs in: unique in one path, core in all paths, soft_core in
+    all but one and accessory otherwise (unique takes precedence, e.g. with two paths).
+
+    Returns:
+        numpy.ndarray: The index into CORENESS_CLASSES of every node, indexed by node id (-1 for ids without a segment).
+    """
+    _, nodes, _, _, _ = path_node_pairs(graph)
+    occurrence = np.bincount(nodes, minlength=graph.node_ids.max(initial=0) + 1)
+    genome_count = len(graph.path_names)
+
+    coreness = np.full(len(occurrence), -1, dtype=np.int8)
+    coreness[graph.node_ids] = CORENESS_CLASSES.index('accessory')
+    present = coreness >= 0
+    coreness[present & (occurrence == genome_count)] = CORENESS_CLASSES.index('core')
+    coreness[present & (occurrence == genome_count - 1)] = CORENESS_CLASSES.index('soft_core')
+    coreness[present & (occurrence == 1)] = CORENESS_CLASSES.index('unique')
+    return coreness
+
+
+def coreness_percentages(graph: GfaGraph, coreness: np.ndarray, copy_number: bool = True) -> list:
+    """
+    Computes the percentage of the bp of every path in each coreness class, for coreness_stats.csv.
+
+    Args:
+        graph (GfaGraph): The graph.
+        coreness (numpy.ndarray): The output of node_coreness.
+        copy_number (bool): Count a node once for every traversal; if False, every node in a path is counted once.
+
+    Returns:
+        list: Per path, the percentages as floats, in the order of CORENESS_CLASSES.
+    """
+    lengths = graph.lengths_by_id()
+    if copy_number:
+        paths, nodes = graph.step_paths(), graph.steps
+    else:
+        paths, nodes, _, _, _ = path_node_pairs(graph)
+
+    class_count = len(CORENESS_CLASSES)
+    bp = np.bincount(paths * class_count + coreness[nodes], weights=lengths[nodes],
+                     minlength=len(graph.path_names) * class_count).reshape(-1, class_count).astype(np.int64)
+    return [[int(value) / int(total) * 100 for value in row] for row, total in zip(bp, bp.sum(axis=1))]
@@ -0,0 +1,224 @@
+"""
+Topology statistics of a GFA graph from its S and L records.
+
+The links are stored as a CSR adjacency over oriented node handles: handle 2 * (id - 1) is the forward strand of a
+node and handle 2 * (id - 1) + 1 the reverse strand. Every link a -> b is added together with its reverse complement
+flip(b) -> flip(a), so the out-degree of a handle is the number of edges leaving that side of the node. All statistics
+are computed with array operations over the edges, so graphs with tens of millions of links need no Python loop
+beyond parsing.
+
+Statistics:
+    degree distribution  the number of nodes per degree (edges on both sides of the node)
+    tips                 node sides without any edge
+    simple bubbles       a source side whose branches are single nodes with one edge on either side, or a direct
+                         edge, all ending on the same sink side (SNPs, small indels and other simple variation sites)
+    complex regions      the share of the bp in nodes with a branching side that is not part of a simple bubble
+
+Usage:
+    python3 gfa_topology.py data.gfa -o ./
+"""
+
+import os
+import argparse
+from typing import NamedTuple
+import numpy as np
+from gfa_reader import read_gfa, GfaGraph
+
+
+class Adjacency(NamedTuple):
+    offsets: np.ndarray
+    targets: np.ndarray
+
+    def out_degree(self) -> np.ndarray:
+        """Returns the number of edges leaving every handle."""
+        return np.diff(self.offsets)
+
+    def sources(self) -> np.ndarray:
+        """Returns the source handle of every edge."""
+        return np.repeat(np.arange(len(self.offsets) - 1), self.out_degree())
+
+
+def flip(handles: np.ndarray) -> np.ndarray:
+    """Returns the handles of the opposite strand."""
+    return handles ^ 1
+
+
+def read_gfa_links(gfa_path: str) -> tuple:
+    """
+    Reads the node lengths and links of a GFA file, without building objects per record.
+
+    Args:
+        gfa_path (str): The GFA file.
+
+    Returns:
+        tuple: The length of every node indexed by node id - 1, and the source and target handles of every link.
+    """
+    return graph_links(read_gfa(gfa_path, sequences=False))
+
+
+def graph_links(graph: GfaGraph) -> tuple:
+    """Returns the node lengths indexed by node id - 1 and the link handles of a graph read with gfa_reader."""
+    return graph.lengths_by_id()[1:], graph.link_sources, graph.link_targets
+
+
+def build_adjacency(node_count: int, sources: np.ndarray, targets: np.ndarray) -> Adjacency:
+    """
+    Builds the CSR adjacency over oriented handles, with the reverse complement of every link and without duplicates.
+
+    Args:
+        node_count (int): The number of nodes.
+        sources (numpy.ndarray): The source handle of every link.
+        targets (numpy.ndarray): The target handle of every link.
+
+    Returns:
+        Adjacency: The adjacency with the targets of every handle sorted.
+    """
+    handle_count = 2 * node_count
+    edges = np.concatenate([sources * handle_count + targets, flip(targets) * handle_count + flip(sources)])
+    edges.sort()
+    edges = edges[np.append(True, edges[1:] != edges[:-1])] if len(edges) else edges
+    edge_sources, edge_targets = np.divmod(edges, handle_count)
+
+    offsets = np.zeros(handle_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(edge_sources, minlength=handle_count), out=offsets[1:])
+    return Adjacency(offsets, edge_targets)
+
+
+def handle_reduce(adjacency: Adjacency, ufunc: np.ufunc, values: np.ndarray) -> np.ndarray:
+    """
+    Reduces a value per edge to a value per handle, e.g. with np.maximum. Handles without edges get 0.
+    """
+    result = np.zeros(len(adjacency.offsets) - 1, dtype=values.dtype)
+    nonempty = np.flatnonzero(adjacency.out_degree())
+    if len(nonempty):
+        # The edges of consecutive non-empty handles are adjacent, so reduceat splits exactly per handle
+        result[nonempty] = ufunc.reduceat(values, adjacency.offsets[nonempty])
+    return result
+
+
+def find_simple_bubbles(adjacency: Adjacency, node_lengths: np.ndarray) -> tuple:
+    """
+    Finds the simple bubbles: a source handle with two or more branches that all end on the same sink handle, where
+    a branch is either a direct edge to the sink or a single node with exactly one edge on each side.
+
+    Every bubble is found from both of its ends; both sources are reported as resolved, but the bubble is counted once.
+
+    Args:
+        adjacency (Adjacency): The graph adjacency.
+        node_lengths (numpy.ndarray): The length of every node, indexed by node id - 1.
+
+    Returns:
+        tuple: A boolean array marking the handles that open a simple bubble, and per counted bubble its source handle,
+               number of branches and shortest and longest branch in bp (0 for a direct edge).
+    """
+    out_degree = adjacency.out_degree()
+    targets = adjacency.targets
+
+    # A branch node has one edge on each side; its branch ends on its single successor, a direct edge on the target
+    simple = (out_degree[targets] == 1) & (out_degree[flip(targets)] == 1)
+    ends = targets.copy()
+    ends[simple] = targets[adjacency.offsets[targets[simple]]]
+    branch_bp = np.where(simple, node_lengths[targets // 2], 0)
+
+    # Bubble sources: branching handles whose branches all end on the same sink, which has no other incoming edges
+    candidates = np.flatnonzero((out_degree >= 2)
+                                & (handle_reduce(adjacency, np.minimum, ends) == handle_reduce(adjacency, np.maximum, ends)))
+    sinks = ends[adjacency.offsets[candidates]]
+    closed = (out_degree[flip(sinks)] == out_degree[candidates]) & (sinks != candidates) & (sinks != flip(candidates))
+    bubble_sources = candidates[closed]
+
+    resolved = np.zeros(len(out_degree), dtype=bool)
+    resolved[bubble_sources] = True
+
+    # Count every bubble once, from the end with the lower handle
+    counted = bubble_sources[bubble_sources <= flip(sinks[closed])]
+    shortest = handle_reduce(adjacency, np.minimum, branch_bp)[counted]
+    longest = handle_reduce(adjacency, np.maximum, branch_bp)[counted]
+
+    return resolved, counted, out_degree[counted], shortest, longest
+
+
+def topology_stats(node_lengths: np.ndarray, sources: np.ndarray, targets: np.ndarray) -> tuple:
+    """
+    Computes the topology statistics of a graph.
+
+    Args:
+        node_lengths (numpy.ndarray): The length of every node, indexed by node id - 1.
+        sources (numpy.ndarray): The source handle of every link.
+        targets (numpy.ndarray): The target handle of every link.
+
+    Returns:
+        tuple: A dict of the statistics, and the number of nodes per degree (index = degree).
+    """
+    node_count = len(node_lengths)
+    adjacency = build_adjacency(node_count, sources, targets)
+    out_degree = adjacency.out_degree()
+    node_degree = out_degree[0::2] + out_degree[1::2]
+
+    resolved, bubbles, branches, shortest, longest = find_simple_bubbles(adjacency, node_lengths)
+
+    # A node is in a complex region if one of its sides branches outside a simple bubble
+    unresolved = (out_degree >= 2) & ~resolved
+    complex_nodes = unresolved[0::2] | unresolved[1::2]
+    total_bp = int(node_lengths.sum())
+
+    stats = {
+        'nodes': node_count,
+        # Every link is stored twice, except links that are their own reverse complement
+        'edges': int(len(adjacency.targets) + np.count_nonzero(adjacency.targets == flip(adjacency.sources()))) // 2,
+        'mean_degree': round(float(node_degree.mean()), 3) if node_count else 0.0,
+        'max_degree': int(node_degree.max(initial=0)),
+        'tips': int(np.count_nonzero(out_degree == 0)),
+        'isolated_nodes': int(np.count_nonzero(node_degree == 0)),
+        'simple_bubbles': len(bubbles),
+        # A SNP has only 1 bp branches; a bubble with a direct edge is an indel
+        'snp_bubbles': int(np.count_nonzero((shortest == 1) & (longest == 1))),
+        'multiallelic_bubbles': int(np.count_nonzero(branches > 2)),
+        'mean_bubble_bp': round(float(longest.mean()), 3) if len(longest) else 0.0,
+        'max_bubble_bp': int(longest.max(initial=0)),
+        'complex_bp': int(node_lengths[complex_nodes].sum()),
+        'complex_pct': 100 * float(node_lengths[complex_nodes].sum()) / total_bp if total_bp else 0.0,
+    }
+
+    return stats, np.bincount(node_degree)
+
+
+def write_topology_stats(gfa_path: str, output_path: str, name: str = None, graph: GfaGraph = None) -> dict:
+    """
+    Computes the topology statistics of a GFA file and writes them as MultiQC tables.
+
+    Writes topology_stats.csv, one row with all statistics, and degree_distribution.csv, the number of nodes per degree.
+
+    Args:
+        gfa_path (str): The GFA file.
+        output_path (str): Directory to write the tables to (with trailing slash).
+        name (str): The row name. Defaults to the directory of the GFA file, e.g. the community.
+        graph (GfaGraph): The graph, if it was already read with gfa_reader.
+
+    Returns:
+        dict: The statistics.
+    """
+    name = name or os.path.basename(os.path.dirname(os.path.abspath(gfa_path)))
+    links = graph_links(graph) if graph is not None else read_gfa_links(gfa_path)
+    stats, degree_counts = topology_stats(*links)
+
+    with open(output_path + "topology_stats.csv", 'w') as f:
+        f.write(','.join(['graph'] + list(stats)) + '\n')
+        f.write(','.join([name] + [str(value) for value in stats.values()]) + '\n')
+
+    with open(output_path + "degree_distribution.csv", 'w') as f:
+        f.write(','.join(['graph'] + [str(degree) for degree in range(len(degree_counts))]) + '\n')
+        f.write(','.join([name] + [str(count) for count in degree_counts]) + '\n')
+
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Computes topology statistics of a GFA graph from its links.")
+    parser.add_argument('gfa_path', help="GFA file")
+    parser.add_argument('-o', '--output', dest='output', default='./', help="output directory (with trailing slash) [default: ./]")
+    parser.add_argument('-n', '--name', dest='name', default=None, help="row name in the tables [default: the directory of the GFA file]")
+    args = parser.parse_args()
+
+    for key, value in write_topology_stats(args.gfa_path, args.output, args.name).items():
+        print(f"{key}: {value}")
@@ -0,0 +1,160 @@
+"""
+Static PNG rendering of the node presence heatmap without Plotly or kaleido.
+
+The presence (or copy number) matrix is mapped straight to RGB with the colour scales of gfa_utils.create_heatmap:
+one row of pixels per genome, with the total node presence strip underneath in the Reds scale. Graphs with more
+nodes than the image width are downsampled by averaging the colours of the nodes that fall in each pixel column,
+so a heatmap of millions of nodes costs about as much as reading the matrix. The image is encoded with zlib.
+
+Usage:
+    python3 heatmap_png.py matrix.csv heatmap.png [-w 1800]
+"""
+
+import csv
+import sys
+import zlib
+import struct
+import argparse
+import numpy as np
+
+# Colours of create_heatmap; Reds is the Plotly (colorbrewer) scale of the totals strip
+PRESENCE_COLORS = {-1: (50, 205, 50), 0: (211, 211, 211), 1: (31, 119, 180)}
+REDS = [(255, 245, 240), (254, 224, 210), (252, 187, 161), (252, 146, 114), (251, 106, 74), (239, 59, 44),
+        (203, 24, 29), (165, 15, 21), (103, 0, 13)]
+
+STRIP_GAP = 4  # Pixel rows between the genomes and the totals strip
+
+
+def apply_colorscale(values: np.ndarray, stops: list, zmin: float, zmax: float) -> np.ndarray:
+    """
+    Maps values to colours by linear interpolation between evenly spaced stops, as Plotly does for a colorscale.
+
+    Args:
+        values (numpy.ndarray): The values to colour.
+        stops (list): RGB tuples, evenly spaced from zmin to zmax.
+        zmin (float): The value of the first stop.
+        zmax (float): The value of the last stop.
+
+    Returns:
+        numpy.ndarray: Float RGB values with one more (last) axis than values.
+    """
+    positions = np.linspace(0, 1, len(stops))
+    scaled = (values - zmin) / (zmax - zmin) if zmax > zmin else np.zeros(values.shape)
+    stops = np.asarray(stops, dtype=np.float64)
+    return np.stack([np.interp(scaled, positions, stops[:, channel]) for channel in range(3)], axis=-1)
+
+
+def presence_scale(data: np.ndarray) -> tuple:
+    """
+    Picks the colour scale of create_heatmap for a genome x node matrix: green for reverse (-1), grey for absent and
+    blue for present, or grey to blue for copy numbers above 1.
+
+    Returns:
+        tuple: The colour stops and the values of the first and last stop.
+    """
+    green, grey, blue = PRESENCE_COLORS[-1], PRESENCE_COLORS[0], PRESENCE_COLORS[1]
+    zmin, zmax = float(data.min(initial=0)), float(data.max(initial=1))
+    if data.size and data.max() > 1:
+        return [grey, blue], float(data.min()), zmax
+    if data.size and data.min() < 0:
+        return [green, grey, blue], zmin, zmax
+    return [grey, blue], zmin, zmax
+
+
+def resample_columns(image: np.ndarray, width: int) -> np.ndarray:
+    """
+    Resamples the columns of an image to a width: wider images are averaged over the columns falling in each pixel,
+    narrower ones are repeated to the largest whole multiple of their width.
+    """
+    columns = image.shape[1]
+    if columns == 0:
+        return image
+    if columns <= width:
+        return np.repeat(image, max(1, width // columns), axis=1)
+
+    bins = np.linspace(0, columns, width + 1).astype(np.int64)
+    bins = np.unique(bins[:-1])
+    sums = np.add.reduceat(image, bins, axis=1)
+    return sums / np.diff(np.append(bins, columns))[None, :, None]
+
+
+def render_heatmap(data: np.ndarray, col_totals: np.ndarray, width: int = 1800, max_height: int = 1200) -> np.ndarray:
+    """
+    Renders the presence matrix and the totals strip to an RGB image.
+
+    The matrix is coloured one genome at a time, so besides the matrix itself, e.g. as int8, only one row of colours
+    is held in memory at full resolution.
+
+    Args:
+        data (numpy.ndarray): The genome x node presence or copy number matrix.
+        col_totals (numpy.ndarray): The total presence of every node, shown as a strip below the genomes.
+        width (int): The image width in pixels.
+        max_height (int): The height in pixels that the genome rows are scaled to fit in.
+
+    Returns:
+        numpy.ndarray: The image as a (height x width x 3) uint8 array.
+    """
+    data = np.asarray(data)
+    if not np.issubdtype(data.dtype, np.number):
+        data = data.astype(np.float64)
+    col_totals = np.asarray(col_totals, dtype=np.float64)
+    genomes = max(1, data.shape[0])
+    row_height = max(1, min(40, max_height // genomes))
+
+    # Like the Plotly Reds scale, the totals strip runs from the smallest to the largest total
+    total_min, total_max = (col_totals.min(), col_totals.max()) if col_totals.size else (0, 0)
+    strip = resample_columns(apply_colorscale(col_totals[None, :], REDS, total_min, total_max), width)
+    stops, zmin, zmax = presence_scale(data)
+    rows = np.zeros((0,) + strip.shape[1:])
+    if data.shape[0]:
+        rows = np.concatenate([resample_columns(apply_colorscale(row[None, :].astype(np.float64), stops, zmin, zmax),
+                                                width) for row in data])
+    gap = np.full((STRIP_GAP, strip.shape[1], 3), 255.0)
+
+    image = np.concatenate([np.repeat(rows, row_height, axis=0), gap, np.repeat(strip, row_height, axis=0)])
+    return np.rint(image).astype(np.uint8)
+
+
+def write_png(png_path: str, image: np.ndarray):
+    """
+    Writes an RGB image as an 8-bit PNG file.
+
+    Args:
+        png_path (str): The output file.
+        image (numpy.ndarray): The image as a (height x width x 3) uint8 array.
+    """
+    height, width = image.shape[:2]
+
+    def chunk(chunk_type: bytes, payload: bytes) -> bytes:
+        return (struct.pack('>I', len(payload)) + chunk_type + payload
+                + struct.pack('>I', zlib.crc32(chunk_type + payload) & 0xffffffff))
+
+    # Every scanline starts with filter type 0 (none)
+    scanlines = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    scanlines[:, 1:] = image.reshape(height, width * 3)
+
+    with open(png_path, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)))
+        f.write(chunk(b'IDAT', zlib.compress(scanlines.tobytes(), 6)))
+        f.write(chunk(b'IEND', b''))
+
+
+def read_matrix(matrix_csv: str) -> np.ndarray:
+    """Reads the ';'-separated matrix.csv written by gfa.py into a genome x node array."""
+    csv.field_size_limit(sys.maxsize)
+    with open(matrix_csv, 'r') as csv_file:
+        reader = csv.reader(csv_file, delimiter=';')
+        next(reader)  # Skip header
+        return np.array([row[1:] for row in reader], dtype=np.int64)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Renders the node presence heatmap of matrix.csv as a PNG.")
+    parser.add_argument('matrix_csv', help="matrix.csv written by gfa.py")
+    parser.add_argument('png_path', help="output PNG file")
+    parser.add_argument('-w', '--width', dest='width', type=int, default=1800, help="image width in pixels [default: 1800]")
+    args = parser.parse_args()
+
+    data = read_matrix(args.matrix_csv)
+    write_png(args.png_path, render_heatmap(data, np.abs(data).sum(axis=0), args.width))
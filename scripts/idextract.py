@@ -1,21 +1,29 @@
-import json
+import sys
+import argparse
+import numpy as np
+from gamjson import read_gam_json
 
-def extract_node_ids(json_file):
-    node_ids = []
-    with open(json_file, 'r') as file:
-        for line in file:
-            alignment = json.loads(line)
-            if 'path' in alignment and 'mapping' in alignment['path']:
-                for mapping in alignment['path']['mapping']:
-                    if 'position' in mapping and 'node_id' in mapping['position']:
-                        node_id = mapping['position']['node_id']
-                        node_ids.append(node_id)
-    return node_ids
 
-# Replace 'giraffe_4287_effectors.json' with the path to your JSON file
-node_ids = extract_node_ids('annotated.json')
+def extract_node_ids(json_file, threads=None):
+    """
+    Extracts the ids of all nodes that alignments in a `vg view -aj` JSON file map to.
 
-# Print the extracted node IDs
-for nid in set(node_ids):  # Using set to remove duplicate IDs
-    print(nid)
+    Args:
+        json_file (str): Path to the JSON-lines file.
+        threads (int): Number of worker processes. Defaults to the number of CPUs.
 
+    Returns:
+        numpy.ndarray: The sorted, unique node ids.
+    """
+    records = read_gam_json(json_file, threads)
+    return np.unique(records.node_ids)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Prints the unique node ids of the alignments in a vg GAM JSON file.")
+    parser.add_argument('json_file', nargs='?', default='annotated.json', help="vg view -aj output [default: annotated.json]")
+    parser.add_argument('-t', '--threads', dest='threads', type=int, default=None, help="number of worker processes [default: all CPUs]")
+    args = parser.parse_args()
+
+    node_ids = extract_node_ids(args.json_file, args.threads)
+    sys.stdout.write(''.join(f'{nid}\n' for nid in node_ids))
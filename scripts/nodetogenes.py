@@ -1,49 +1,45 @@
-import csv
-import json
-import sys
-
-# Increase the maximum field size limit
-csv.field_size_limit(sys.maxsize)
-
-# Load node lengths from the CSV file
-node_lengths = {}
-with open('../nodes.csv', 'r') as csv_file:
-    reader = csv.reader(csv_file, delimiter=';')
-    next(reader)  # Skip header
-    for row in reader:
-        node_id, sequence = row
-        node_lengths[node_id] = len(sequence)
-
-# Load the node IDs
-with open('nodes.txt') as f:
-    node_ids = {line.strip() for line in f}
-
-# Parse the JSON file and calculate aligned nucleotide count
-gene_to_info = {}
-with open('../annotated.json', 'r') as file:
-    for line in file:
-        alignment = json.loads(line)
-        gene_id = alignment.get('name', 'Unknown')
-
-        # Initialize data structure for each gene
-        if gene_id not in gene_to_info:
-            gene_to_info[gene_id] = {'aligned_length': 0, 'node_count': set()}
-
-        # Check each mapping in the path
-        if 'path' in alignment and 'mapping' in alignment['path']:
-            for mapping in alignment['path']['mapping']:
-                if 'position' in mapping and 'node_id' in mapping['position']:
-                    node_id = str(mapping['position']['node_id'])  # Convert to string for matching
-
-                    if node_id in node_ids:
-                        total_edit_length = sum(edit.get('to_length', 0) for edit in mapping['edit'])
-                        gene_to_info[gene_id]['aligned_length'] += total_edit_length
-                        gene_to_info[gene_id]['node_count'].add(node_id)
-
-# Output the mapping in TSV format
-with open('gene_id_node_count_aligned_length.tsv', 'w') as out_file:
-    out_file.write('GeneID\tNodeCount\tAlignedLength\n')
-    for gene_id, info in gene_to_info.items():
-        out_file.write(f'{gene_id}\t{len(info["node_count"])}\t{info["aligned_length"]}\n')
-
-print("TSV file created: gene_id_node_count_aligned_length.tsv")
+import os
+import argparse
+import numpy as np
+from gamjson import read_gam_json
+from geneindex import build_gene_index, load_gene_index, join_sample
+
+
+def load_node_ids(node_file):
+    """
+    Loads the ids of the nodes present in a sample, one per line.
+
+    Args:
+        node_file (str): Path to the node id file.
+
+    Returns:
+        numpy.ndarray: The node ids.
+    """
+    with open(node_file) as f:
+        return np.array([int(line) for line in f if line.strip()], dtype=np.int64)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Counts the present nodes and aligned nucleotides per annotated gene.")
+    parser.add_argument('-i', '--index', dest='index', default='../gene_index.npz', help="gene to node index built by geneindex.py [default: ../gene_index.npz]")
+    parser.add_argument('-j', '--json', dest='json_file', default='../annotated.json', help="vg view -aj output of vg annotate, used if there is no index [default: ../annotated.json]")
+    parser.add_argument('-n', '--nodes', dest='node_file', default='nodes.txt', help="ids of the nodes present in the sample [default: nodes.txt]")
+    parser.add_argument('-o', '--output', dest='output', default='gene_id_node_count_aligned_length.tsv', help="output TSV file")
+    parser.add_argument('-t', '--threads', dest='threads', type=int, default=None, help="number of worker processes when parsing JSON [default: all CPUs]")
+    args = parser.parse_args()
+
+    # Use the community index if it was built, otherwise index the annotated alignments now
+    if os.path.isfile(args.index):
+        index = load_gene_index(args.index)
+    else:
+        index = build_gene_index(read_gam_json(args.json_file, args.threads))
+
+    node_counts, aligned_lengths = join_sample(index, load_node_ids(args.node_file))
+
+    # Output the mapping in TSV format
+    with open(args.output, 'w') as out_file:
+        out_file.write('GeneID\tNodeCount\tAlignedLength\n')
+        for gene_id, node_count, aligned_length in zip(index.gene_ids, node_counts, aligned_lengths):
+            out_file.write(f'{gene_id}\t{node_count}\t{aligned_length}\n')
+
+    print(f"TSV file created: {args.output}")
@@ -0,0 +1,174 @@
+"""
+Finds the single-copy BUSCO orthologs shared by the genomes in a directory.
+
+The single_copy_busco_sequences directories of all genomes are scanned in parallel with os.scandir and stored as a
+sparse genome x BUSCO occupancy matrix (busco_occupancy.npz in the parent directory). Ortholog lists at any occupancy
+threshold are then selected from the matrix, without scanning the BUSCO sequences again.
+
+The matrix is stored in compressed sparse row layout (one row per genome):
+    genomes         the genome names
+    buscos          the BUSCO ids
+    genome_offsets  CSR offsets; genome i owns entries genome_offsets[i]:genome_offsets[i + 1] of busco_indices
+    busco_indices   the indices into buscos of the single-copy BUSCOs of the genome
+    lineage         the BUSCO lineage dataset that was scanned
+    busco_dirs      the scanned *busco_output directories, relative to the parent directory
+
+The matrix is scanned again when the lineage or the set of *busco_output directories changes.
+
+Usage:
+    python3 orthologfinder.py PARENT_DIR [--min-occupancy 0.9]
+"""
+
+import os
+import sys
+import math
+import glob
+import argparse
+import concurrent.futures
+from typing import NamedTuple
+import numpy as np
+
+BUSCO_SUFFIX = '.faa'
+
+
+class OccupancyMatrix(NamedTuple):
+    genomes: np.ndarray
+    buscos: np.ndarray
+    genome_offsets: np.ndarray
+    busco_indices: np.ndarray
+    lineage: str
+    busco_dirs: np.ndarray
+
+    def busco_counts(self) -> np.ndarray:
+        """Returns the number of genomes in which each BUSCO is single-copy."""
+        return np.bincount(self.busco_indices, minlength=len(self.buscos))
+
+    def select(self, min_occupancy: float) -> np.ndarray:
+        """Returns the BUSCOs that are single-copy in at least min_occupancy (0-1) of the genomes."""
+        min_genomes = math.ceil(min_occupancy * len(self.genomes) - 1e-9)
+        return self.buscos[self.busco_counts() >= max(1, min_genomes)]
+
+
+def genome_name(busco_output_dir: str) -> str:
+    """Names a genome after its BUSCO output directory, e.g. Fol4287 for Fol4287_busco_output."""
+    name = os.path.basename(busco_output_dir)
+    return name[:-len('busco_output')].rstrip('_.-') or name
+
+
+def scan_genome(sequence_dir: str) -> list:
+    """
+    Lists the single-copy BUSCOs of one genome.
+
+    Args:
+        sequence_dir (str): The single_copy_busco_sequences directory of the genome.
+
+    Returns:
+        list: The BUSCO ids, without the .faa extension.
+    """
+    with os.scandir(sequence_dir) as entries:
+        return [entry.name[:-len(BUSCO_SUFFIX)] for entry in entries
+                if entry.name.endswith(BUSCO_SUFFIX) and entry.is_file()]
+
+
+def find_busco_dirs(parent_dir: str, lineage: str) -> list:
+    """
+    Lists the BUSCO output directories with results for a lineage.
+
+    Args:
+        parent_dir (str): Directory containing the *busco_output directories.
+        lineage (str): The BUSCO lineage dataset, e.g. ascomycota_odb10.
+
+    Returns:
+        list: The sorted *busco_output directory names, relative to parent_dir.
+    """
+    pattern = os.path.join(parent_dir, '*busco_output', f'run_{lineage}', 'busco_sequences', 'single_copy_busco_sequences')
+    return sorted(os.path.relpath(path, parent_dir).split(os.sep)[0] for path in glob.glob(pattern) if os.path.isdir(path))
+
+
+def sequence_dir(parent_dir: str, busco_dir: str, lineage: str) -> str:
+    """Returns the single_copy_busco_sequences directory of a BUSCO output directory."""
+    return os.path.join(parent_dir, busco_dir, f'run_{lineage}', 'busco_sequences', 'single_copy_busco_sequences')
+
+
+def scan_genomes(parent_dir: str, lineage: str, threads: int = None) -> OccupancyMatrix:
+    """
+    Builds the occupancy matrix of all genomes in a directory.
+
+    Args:
+        parent_dir (str): Directory containing the *busco_output directories.
+        lineage (str): The BUSCO lineage dataset, e.g. ascomycota_odb10.
+        threads (int): Number of directories scanned in parallel.
+
+    Returns:
+        OccupancyMatrix: One row per genome, sorted by genome name.
+    """
+    busco_dirs = find_busco_dirs(parent_dir, lineage)
+    genomes = [genome_name(busco_dir) for busco_dir in busco_dirs]
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads or 32) as executor:
+        genome_buscos = list(executor.map(scan_genome, [sequence_dir(parent_dir, busco_dir, lineage)
+                                                        for busco_dir in busco_dirs]))
+
+    buscos, busco_indices = np.unique(np.array([busco for names in genome_buscos for busco in names], dtype=str),
+                                      return_inverse=True)
+    genome_offsets = np.zeros(len(genomes) + 1, dtype=np.int64)
+    np.cumsum([len(names) for names in genome_buscos], out=genome_offsets[1:])
+
+    return OccupancyMatrix(
+        genomes=np.array(genomes, dtype=str),
+        buscos=buscos,
+        genome_offsets=genome_offsets,
+        busco_indices=busco_indices.ravel().astype(np.int64),
+        lineage=lineage,
+        busco_dirs=np.array(busco_dirs, dtype=str)
+    )
+
+
+def save_occupancy_matrix(matrix: OccupancyMatrix, matrix_path: str):
+    """Saves an occupancy matrix as a compressed .npz file."""
+    np.savez_compressed(matrix_path, **matrix._asdict())
+
+
+def load_occupancy_matrix(matrix_path: str) -> OccupancyMatrix:
+    """Loads an occupancy matrix saved with save_occupancy_matrix, or returns None if it lacks any field."""
+    with np.load(matrix_path) as data:
+        if any(field not in data.files for field in OccupancyMatrix._fields):
+            return None
+        matrix = OccupancyMatrix(**{field: data[field] for field in OccupancyMatrix._fields})
+    return matrix._replace(lineage=str(matrix.lineage))
+
+
+def is_current(matrix: OccupancyMatrix, parent_dir: str, lineage: str) -> bool:
+    """Checks that an occupancy matrix was scanned for this lineage and the current BUSCO output directories."""
+    return matrix.lineage == lineage and list(matrix.busco_dirs) == find_busco_dirs(parent_dir, lineage)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Finds the single-copy BUSCO orthologs shared by the genomes in a directory.")
+    parser.add_argument('parent_dir', help="directory containing the *busco_output directories")
+    parser.add_argument('-m', '--min-occupancy', dest='min_occupancy', type=float, default=1.0, help="fraction of genomes an ortholog must be single-copy in [default: 1.0]")
+    parser.add_argument('-l', '--lineage', dest='lineage', default='ascomycota_odb10', help="BUSCO lineage dataset [default: ascomycota_odb10]")
+    parser.add_argument('-o', '--output', dest='output', default=None, help="output ortholog list [default: PARENT_DIR/orthologs.txt]")
+    parser.add_argument('-t', '--threads', dest='threads', type=int, default=None, help="number of directories scanned in parallel [default: 32]")
+    parser.add_argument('--rescan', dest='rescan', default=False, action='store_true', help="scan the directories even if the occupancy matrix is up to date")
+    args = parser.parse_args()
+
+    if not 0 < args.min_occupancy <= 1:
+        parser.error("--min-occupancy should be above 0 and at most 1")
+
+    matrix_path = os.path.join(args.parent_dir, 'busco_occupancy.npz')
+    matrix = load_occupancy_matrix(matrix_path) if os.path.isfile(matrix_path) and not args.rescan else None
+    if matrix is None or not is_current(matrix, args.parent_dir, args.lineage):
+        matrix = scan_genomes(args.parent_dir, args.lineage, args.threads)
+        if not len(matrix.genomes):
+            print(f"Error: no BUSCO output for lineage {args.lineage} found in {args.parent_dir}")
+            sys.exit(1)
+        save_occupancy_matrix(matrix, matrix_path)
+
+    orthologs = matrix.select(args.min_occupancy)
+    output_file = args.output or os.path.join(args.parent_dir, 'orthologs.txt')
+    with open(output_file, 'w') as f:
+        f.write(''.join(f'{ortholog}\n' for ortholog in orthologs))
+
+    print(f"{len(orthologs)} of {len(matrix.buscos)} orthologs are single-copy in at least "
+          f"{args.min_occupancy:.0%} of {len(matrix.genomes)} genomes. Listed in {output_file}")
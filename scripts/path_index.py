@@ -0,0 +1,339 @@
+"""
+Coordinate index of the paths in a pangenome graph.
+
+For every path (genome) the index stores the node of each step and the offset at which the step starts in the path,
+sorted by position. The nodes (and their coreness) overlapping a region of a genome are then found by binary search,
+without vg. Batches of regions, such as the genes in a BED file, are resolved at once with np.searchsorted.
+
+The index is a directory written by gfa.py with:
+    paths.txt         the path names, one per line
+    path_offsets.npy  path i owns steps path_offsets[i]:path_offsets[i + 1] of the arrays below
+    node_ids.npy      the node of every step
+    starts.npy        the 0-based start of every step in its path
+    node_lengths.npy  the sequence length of every node, indexed by node id
+    coreness.npy      the coreness class of every node, indexed by node id (see CORENESS_CLASSES, -1 if unknown)
+
+The windows command turns the index into bedGraph tracks of the core, soft_core, accessory and unique fraction of
+every window of every path, plus a chrom.sizes file, so they can be converted with bedGraphToBigWig.
+
+Usage:
+    python3 path_index.py query path_index/ genome#1#chr1 10000 20000
+    python3 path_index.py bed path_index/ genes.bed -o genes_nodes.tsv
+    python3 path_index.py windows path_index/ -w 10000 -o coreness_tracks/
+"""
+
+import os
+import sys
+import argparse
+from typing import NamedTuple, List
+import numpy as np
+
+CORENESS_CLASSES = ['core', 'soft_core', 'accessory', 'unique']
+
+
+class PathIndex(NamedTuple):
+    paths: List[str]
+    path_offsets: np.ndarray
+    node_ids: np.ndarray
+    starts: np.ndarray
+    node_lengths: np.ndarray
+    coreness: np.ndarray
+
+    def path_number(self, path: str) -> int:
+        """Returns the number of a path in the index."""
+        try:
+            return self.paths.index(path)
+        except ValueError:
+            raise KeyError(f"Path {path} is not in the index") from None
+
+    def path_steps(self, path: str) -> slice:
+        """Returns the slice of the step arrays that belongs to a path."""
+        number = self.path_number(path)
+        return slice(self.path_offsets[number], self.path_offsets[number + 1])
+
+    def path_length(self, path: str) -> int:
+        """Returns the length of a path in bp."""
+        steps = self.path_steps(path)
+        if steps.start == steps.stop:
+            return 0
+        return int(self.starts[steps.stop - 1] + self.node_lengths[self.node_ids[steps.stop - 1]])
+
+    def query(self, path: str, start: int, end: int) -> tuple:
+        """
+        Finds the nodes that overlap the region [start, end) of a path.
+
+        Args:
+            path (str): The path name.
+            start (int): 0-based start of the region.
+            end (int): End of the region, exclusive.
+
+        Returns:
+            tuple: The node ids of the overlapping steps in path order, their start offsets in the path and their
+                   coreness classes (indices into CORENESS_CLASSES).
+        """
+        steps = self.path_steps(path)
+        starts = self.starts[steps]
+        ends = starts + self.node_lengths[self.node_ids[steps]]
+
+        first = np.searchsorted(ends, start, side='right')
+        last = np.searchsorted(starts, end, side='left')
+        if end <= start:
+            last = first
+
+        node_ids = self.node_ids[steps][first:last]
+        return node_ids, starts[first:last], self.coreness[node_ids]
+
+    def query_intervals(self, paths: list, starts: np.ndarray, ends: np.ndarray) -> tuple:
+        """
+        Finds the nodes overlapping a batch of regions at once.
+
+        Args:
+            paths (list): The path name of every region.
+            starts (numpy.ndarray): 0-based starts of the regions.
+            ends (numpy.ndarray): Ends of the regions, exclusive.
+
+        Returns:
+            tuple: interval_offsets and steps, where region i overlaps the steps steps[interval_offsets[i]:interval_offsets[i + 1]]
+                   (indices into the step arrays, in path order).
+        """
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        first = np.zeros(len(starts), dtype=np.int64)
+        last = np.zeros(len(starts), dtype=np.int64)
+
+        # One binary search per path for all of its regions
+        paths = np.asarray(paths, dtype=str)
+        for path in np.unique(paths):
+            if path not in self.paths:
+                print(f"Warning: path {path} is not in the index", file=sys.stderr)
+                continue
+            regions = np.flatnonzero(paths == path)
+            steps = self.path_steps(path)
+            step_starts = self.starts[steps]
+            step_ends = step_starts + self.node_lengths[self.node_ids[steps]]
+            first[regions] = steps.start + np.searchsorted(step_ends, starts[regions], side='right')
+            last[regions] = steps.start + np.searchsorted(step_starts, ends[regions], side='left')
+
+        counts = np.where(ends > starts, np.maximum(last - first, 0), 0)
+        interval_offsets = np.zeros(len(starts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=interval_offsets[1:])
+
+        # Expand every region to the range of its steps
+        steps = np.arange(interval_offsets[-1]) - np.repeat(interval_offsets[:-1] - first, counts)
+        return interval_offsets, steps
+
+
+def build_path_index(paths: list, path_node_ids: list, node_lengths: np.ndarray, coreness: np.ndarray) -> PathIndex:
+    """
+    Builds the coordinate index of a set of paths.
+
+    Args:
+        paths (list): The path names.
+        path_node_ids (list): Per path, an array of the node id of every step.
+        node_lengths (numpy.ndarray): The sequence length of every node, indexed by node id.
+        coreness (numpy.ndarray): The coreness class of every node, indexed by node id.
+
+    Returns:
+        PathIndex: The index.
+    """
+    path_offsets = np.zeros(len(paths) + 1, dtype=np.int64)
+    np.cumsum([len(node_ids) for node_ids in path_node_ids], out=path_offsets[1:])
+    node_ids = np.concatenate(list(path_node_ids) + [np.zeros(0, dtype=np.int64)]).astype(np.int64)
+
+    # The start of a step is the summed length of the steps before it in the same path
+    step_lengths = node_lengths[node_ids]
+    cumulative = np.zeros(len(node_ids) + 1, dtype=np.int64)
+    np.cumsum(step_lengths, out=cumulative[1:])
+    starts = cumulative[:-1] - np.repeat(cumulative[path_offsets[:-1]], np.diff(path_offsets))
+
+    return PathIndex(list(paths), path_offsets, node_ids, starts, np.asarray(node_lengths, dtype=np.int64),
+                     np.asarray(coreness, dtype=np.int8))
+
+
+def save_path_index(index: PathIndex, index_dir: str):
+    """Saves a path index to a directory of .npy files."""
+    os.makedirs(index_dir, exist_ok=True)
+    with open(os.path.join(index_dir, 'paths.txt'), 'w') as f:
+        f.write(''.join(f'{path}\n' for path in index.paths))
+    for field in PathIndex._fields[1:]:
+        np.save(os.path.join(index_dir, f'{field}.npy'), getattr(index, field))
+
+
+def load_path_index(index_dir: str, mmap: bool = True) -> PathIndex:
+    """
+    Loads a path index saved with save_path_index.
+
+    Args:
+        index_dir (str): The index directory.
+        mmap (bool): Memory-map the arrays instead of reading them, so only the queried paths are read from disk.
+
+    Returns:
+        PathIndex: The index.
+    """
+    with open(os.path.join(index_dir, 'paths.txt')) as f:
+        paths = [line.rstrip('\n') for line in f]
+    arrays = [np.load(os.path.join(index_dir, f'{field}.npy'), mmap_mode='r' if mmap else None)
+              for field in PathIndex._fields[1:]]
+    return PathIndex(paths, *arrays)
+
+
+def read_bed(bed_path: str) -> tuple:
+    """
+    Reads the regions of a BED file.
+
+    Returns:
+        tuple: The chromosome (path) names, starts, ends and names (the 4th column, or chrom:start-end) of the regions.
+    """
+    chroms, starts, ends, names = [], [], [], []
+    with open(bed_path) as f:
+        for line in f:
+            if line.startswith(('#', 'track', 'browser')) or not line.strip():
+                continue
+            fields = line.rstrip('\n').split('\t')
+            chroms.append(fields[0])
+            starts.append(int(fields[1]))
+            ends.append(int(fields[2]))
+            names.append(fields[3] if len(fields) > 3 else f'{fields[0]}:{fields[1]}-{fields[2]}')
+
+    return chroms, np.array(starts, dtype=np.int64), np.array(ends, dtype=np.int64), names
+
+
+def write_bed_nodes(index: PathIndex, bed_path: str, output):
+    """
+    Writes, for every region of a BED file, the overlapping nodes and the bp of the region in each coreness class.
+
+    Args:
+        index (PathIndex): The path index.
+        bed_path (str): The BED file.
+        output: A text stream to write the table to.
+    """
+    chroms, starts, ends, names = read_bed(bed_path)
+    interval_offsets, steps = index.query_intervals(chroms, starts, ends)
+
+    # Overlap of every step with its region, summed per region and coreness class
+    counts = np.diff(interval_offsets)
+    regions = np.repeat(np.arange(len(starts)), counts)
+    step_starts = index.starts[steps]
+    step_ends = step_starts + index.node_lengths[index.node_ids[steps]]
+    overlap = np.minimum(step_ends, ends[regions]) - np.maximum(step_starts, starts[regions])
+    classes = index.coreness[index.node_ids[steps]].astype(np.int64)
+    known = classes >= 0
+    class_bp = np.bincount(regions[known] * len(CORENESS_CLASSES) + classes[known], weights=overlap[known],
+                           minlength=len(starts) * len(CORENESS_CLASSES)).reshape(len(starts), len(CORENESS_CLASSES))
+
+    output.write('\t'.join(['chrom', 'start', 'end', 'name', 'nodes'] + [f'{c}_bp' for c in CORENESS_CLASSES]) + '\n')
+    node_ids = index.node_ids[steps]
+    for i in range(len(starts)):
+        nodes = ','.join(str(node) for node in node_ids[interval_offsets[i]:interval_offsets[i + 1]])
+        output.write('\t'.join([chroms[i], str(starts[i]), str(ends[i]), names[i], nodes or '.']
+                               + [str(int(bp)) for bp in class_bp[i]]) + '\n')
+
+
+def coreness_windows(index: PathIndex, path: str, window_size: int) -> tuple:
+    """
+    Computes the fraction of every window of a path that lies in core, soft_core, accessory and unique nodes.
+
+    The bp per class up to each window boundary is read from cumulative sums over the steps of the path, so the
+    cost is one pass over the steps and one binary search per boundary, independent of the window size.
+
+    Args:
+        index (PathIndex): The path index.
+        path (str): The path name.
+        window_size (int): The window size in bp; the last window of the path can be shorter.
+
+    Returns:
+        tuple: The window starts, the window ends and a (windows x classes) array of fractions, in the order of
+               CORENESS_CLASSES.
+    """
+    steps = index.path_steps(path)
+    node_ids = index.node_ids[steps]
+    starts = index.starts[steps]
+    ends = starts + index.node_lengths[node_ids]
+    classes = index.coreness[node_ids].astype(np.int64)
+    length = int(ends[-1]) if len(ends) else 0
+
+    # cumulative[k, c] is the bp of class c in the first k steps of the path
+    known = classes >= 0
+    step_class_bp = np.zeros((len(node_ids), len(CORENESS_CLASSES)), dtype=np.int64)
+    step_class_bp[np.flatnonzero(known), classes[known]] = (ends - starts)[known]
+    cumulative = np.zeros((len(node_ids) + 1, len(CORENESS_CLASSES)), dtype=np.int64)
+    np.cumsum(step_class_bp, axis=0, out=cumulative[1:])
+
+    # bp per class before every window boundary: whole steps ending before it, plus part of the step it falls in
+    boundaries = np.append(np.arange(0, length, window_size, dtype=np.int64), length)
+    step = np.searchsorted(ends, boundaries, side='right')
+    boundary_bp = cumulative[step]
+    inside = np.flatnonzero(step < len(node_ids))
+    inside = inside[classes[step[inside]] >= 0]
+    boundary_bp[inside, classes[step[inside]]] += boundaries[inside] - starts[step[inside]]
+
+    window_bp = np.diff(boundary_bp, axis=0)
+    return boundaries[:-1], boundaries[1:], window_bp / np.diff(boundaries)[:, None]
+
+
+def write_coreness_tracks(index: PathIndex, output_dir: str, window_size: int = 10000):
+    """
+    Writes one bedGraph track per coreness class with the windowed fractions of every path, and a chrom.sizes file.
+
+    Args:
+        index (PathIndex): The path index.
+        output_dir (str): Directory for coreness_<class>.bedgraph and chrom.sizes.
+        window_size (int): The window size in bp.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    tracks = [open(os.path.join(output_dir, f'coreness_{c}.bedgraph'), 'w') for c in CORENESS_CLASSES]
+    try:
+        with open(os.path.join(output_dir, 'chrom.sizes'), 'w') as sizes:
+            # bedGraphToBigWig expects the chromosomes in sorted order
+            for path in sorted(index.paths):
+                starts, ends, fractions = coreness_windows(index, path, window_size)
+                sizes.write(f'{path}\t{index.path_length(path)}\n')
+                for c, track in enumerate(tracks):
+                    track.write(''.join(f'{path}\t{start}\t{end}\t{fraction:.4g}\n'
+                                        for start, end, fraction in zip(starts, ends, fractions[:, c])))
+    finally:
+        for track in tracks:
+            track.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Finds the graph nodes overlapping regions of a genome.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    query_parser = subparsers.add_parser('query', help="nodes overlapping one region")
+    query_parser.add_argument('index_dir', help="path index directory written by gfa.py")
+    query_parser.add_argument('path', help="path (genome) name")
+    query_parser.add_argument('start', type=int, help="0-based start of the region")
+    query_parser.add_argument('end', type=int, help="end of the region, exclusive")
+
+    bed_parser = subparsers.add_parser('bed', help="nodes overlapping every region of a BED file")
+    bed_parser.add_argument('index_dir', help="path index directory written by gfa.py")
+    bed_parser.add_argument('bed', help="BED file with path names as chromosomes")
+    bed_parser.add_argument('-o', '--output', dest='output', default=None, help="output TSV file [default: stdout]")
+
+    windows_parser = subparsers.add_parser('windows', help="windowed coreness fraction tracks of every path")
+    windows_parser.add_argument('index_dir', help="path index directory written by gfa.py")
+    windows_parser.add_argument('-w', '--window-size', dest='window_size', type=int, default=10000, help="window size in bp [default: 10000]")
+    windows_parser.add_argument('-o', '--output', dest='output', default='coreness_tracks', help="output directory [default: coreness_tracks]")
+
+    args = parser.parse_args()
+    index = load_path_index(args.index_dir)
+
+    if args.command == 'query':
+        node_ids, starts, classes = index.query(args.path, args.start, args.end)
+        print('node\tstart\tend\tcoreness')
+        for node_id, start, coreness in zip(node_ids, starts, classes):
+            name = CORENESS_CLASSES[coreness] if coreness >= 0 else 'unknown'
+            print(f'{node_id}\t{start}\t{start + index.node_lengths[node_id]}\t{name}')
+    elif args.command == 'bed':
+        if args.output:
+            with open(args.output, 'w') as output:
+                write_bed_nodes(index, args.bed, output)
+        else:
+            write_bed_nodes(index, args.bed, sys.stdout)
+    elif args.command == 'windows':
+        write_coreness_tracks(index, args.output, args.window_size)
+
+
+if __name__ == '__main__':
+    main()
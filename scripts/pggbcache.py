@@ -0,0 +1,172 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Content-addressed cache for pggb output directories.
+
+The cache key is a hash of the (decompressed) FASTA content, the pggb parameters
+that change the graph (-n, -p, -s, -P) and the pggb version. A rerun with the same key
+reuses the stored output instead of running pggb again.
+
+Usage:
+    key=$(python3 pggbcache.py key input.fa.gz -n 10 -p 95 -s 10000 -P asm5)
+    python3 pggbcache.py fetch cache/pggb $key pggb_out || { pggb ...; python3 pggbcache.py store cache/pggb $key pggb_out; }
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+CHUNK_SIZE = 1 << 20
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+def pggb_version() -> str:
+    """
+    Get the version string of the pggb executable on the PATH.
+
+    Returns:
+        str: The version reported by pggb, or 'unknown' if it could not be determined.
+    """
+    try:
+        result = subprocess.run(["pggb", "--version"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    except OSError:
+        return "unknown"
+
+    version = result.stdout.strip()
+    return version if result.returncode == 0 and version else "unknown"
+
+
+def hash_fasta(fasta_path: str) -> str:
+    """
+    Hash the sequence content of a FASTA file. Gzipped and bgzipped files are hashed
+    after decompression, so recompressing the same sequences gives the same hash.
+
+    Args:
+        fasta_path (str): Path to the (optionally gzipped) FASTA file.
+
+    Returns:
+        str: The SHA-256 hex digest of the FASTA content.
+    """
+    with open(fasta_path, 'rb') as f:
+        compressed = f.read(2) == GZIP_MAGIC
+
+    opener = gzip.open if compressed else open
+    digest = hashlib.sha256()
+    with opener(fasta_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def cache_key(fasta_path: str, params: dict) -> str:
+    """
+    Compute the cache key of a pggb run.
+
+    Args:
+        fasta_path (str): Path to the input FASTA file.
+        params (dict): The pggb parameters that determine the output graph.
+
+    Returns:
+        str: The SHA-256 hex digest identifying this run.
+    """
+    manifest = {
+        'fasta': hash_fasta(fasta_path),
+        'params': {key: str(value) for key, value in sorted(params.items())},
+        'pggb': pggb_version()
+    }
+    return hashlib.sha256(json.dumps(manifest, sort_keys=True).encode()).hexdigest()
+
+
+def fetch(cache_dir: str, key: str, output_dir: str) -> bool:
+    """
+    Copy a cached pggb output into the output directory.
+
+    Args:
+        cache_dir (str): Root directory of the cache.
+        key (str): Cache key of the run.
+        output_dir (str): Directory to place the pggb output files in.
+
+    Returns:
+        bool: True if the key was found in the cache, False otherwise.
+    """
+    entry = os.path.join(cache_dir, key)
+    if not os.path.isdir(entry):
+        return False
+
+    os.makedirs(output_dir, exist_ok=True)
+    for name in os.listdir(entry):
+        source = os.path.join(entry, name)
+        if os.path.isfile(source):
+            shutil.copy2(source, os.path.join(output_dir, name))
+
+    return True
+
+
+def store(cache_dir: str, key: str, output_dir: str):
+    """
+    Store a finished pggb output directory in the cache. The entry is written to a temporary
+    directory first and then renamed, so an interrupted store never leaves a partial entry.
+
+    Args:
+        cache_dir (str): Root directory of the cache.
+        key (str): Cache key of the run.
+        output_dir (str): Directory containing the pggb output files.
+    """
+    entry = os.path.join(cache_dir, key)
+    if os.path.isdir(entry):
+        return
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_entry = tempfile.mkdtemp(prefix=f".{key}.", dir=cache_dir)
+    try:
+        for name in os.listdir(output_dir):
+            source = os.path.join(output_dir, name)
+            if os.path.isfile(source):
+                shutil.copy2(source, os.path.join(tmp_entry, name))
+        os.rename(tmp_entry, entry)
+    except OSError:
+        shutil.rmtree(tmp_entry, ignore_errors=True)
+        # Another run may have stored the same key in the meantime
+        if not os.path.isdir(entry):
+            raise
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Content-addressed cache for pggb output directories.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    key_parser = subparsers.add_parser('key', help="print the cache key of a pggb run")
+    key_parser.add_argument('fasta', help="input FASTA file (fa | fa.gz)")
+    key_parser.add_argument('-n', dest='haplotypes', required=True, help="number of haplotypes")
+    key_parser.add_argument('-p', dest='percent_identity', required=True, help="percent identity")
+    key_parser.add_argument('-s', dest='segment_length', required=True, help="segment length")
+    key_parser.add_argument('-P', dest='poa_params', required=True, help="POA parameters")
+
+    for command, help_text in [('fetch', "copy a cached output into the output directory"),
+                               ('store', "store an output directory in the cache")]:
+        command_parser = subparsers.add_parser(command, help=help_text)
+        command_parser.add_argument('cache_dir', help="root directory of the cache")
+        command_parser.add_argument('key', help="cache key from the 'key' command")
+        command_parser.add_argument('output_dir', help="pggb output directory")
+
+    args = parser.parse_args()
+
+    if args.command == 'key':
+        params = {'n': args.haplotypes, 'p': args.percent_identity, 's': args.segment_length, 'P': args.poa_params}
+        print(cache_key(args.fasta, params))
+    elif args.command == 'fetch':
+        if not fetch(args.cache_dir, args.key, args.output_dir):
+            sys.exit(1)
+    elif args.command == 'store':
+        store(args.cache_dir, args.key, args.output_dir)
+
+
+if __name__ == '__main__':
+    main()
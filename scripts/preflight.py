@@ -0,0 +1,363 @@
+"""
+Preflight cost estimate and schedule of the communities of a partitioned run.
+
+Before any pggb job starts, every community is described with data the sequence partitioning already produced:
+    sequences        the number of sequences in the community (community list)
+    total_bp         the summed length of its sequences (combined.fa.gz.fai)
+    max_length       the length of its longest sequence
+    max_divergence   the largest mash distance between two of its sequences (distances.tsv)
+
+A log-linear cost model predicts the pggb CPU time and peak memory of every community from these features:
+    log(y) = intercept + total_bp * log(total_bp) + sequences * log(sequences) + max_divergence * max_divergence
+The built-in coefficients are rough; the `calibrate` command refits them on the preflight.tsv and telemetry
+run_resource_usage.tsv of earlier runs. Wall time for t threads is predicted with Amdahl's law from the CPU time.
+
+The schedule gives every community a share of the thread budget in proportion to its predicted CPU time (scaled to
+the number of communities that fit in memory at the same time), and launches the longest jobs first (LPT). The schedule is simulated under the thread and memory budget to predict start and end
+times, and communities that do not fit in memory or run longer than --max-hours get a warning.
+
+Usage:
+    python3 preflight.py schedule seqpart/ -t 64 -m 256 -o output/<runid>/preflight/
+    python3 preflight.py calibrate output/<run1> output/<run2> -o preflight_model.json
+"""
+
+import os
+import sys
+import csv
+import glob
+import json
+import heapq
+import argparse
+import numpy as np
+
+FEATURES = ['total_bp', 'sequences', 'max_divergence']
+
+# Order-of-magnitude defaults (about 20 CPU hours and 8 GB for 10 sequences of 5 Mb); calibrate on earlier runs
+DEFAULT_MODEL = {
+    'cpu_time_s': {'intercept': -9.72, 'total_bp': 1.1, 'sequences': 0.5, 'max_divergence': 5.0},
+    'max_rss_mb': {'intercept': -5.86, 'total_bp': 0.8, 'sequences': 0.3, 'max_divergence': 2.0},
+    'serial_fraction': 0.1,
+    'samples': 0
+}
+
+PREFLIGHT_COLUMNS = ['community', 'sequences', 'total_bp', 'max_length', 'max_divergence', 'cpu_time_s', 'max_rss_mb']
+SCHEDULE_COLUMNS = ['index', 'community', 'threads', 'memory_mb', 'order', 'wall_time_h', 'cpu_time_h', 'start_h',
+                    'end_h', 'warning']
+
+
+def design_matrix(features: dict) -> np.ndarray:
+    """Returns the model inputs (1, log total_bp, log sequences, max_divergence) of every community as rows."""
+    return np.column_stack([np.ones(len(features['total_bp'])),
+                            np.log(np.maximum(features['total_bp'], 1)),
+                            np.log(np.maximum(features['sequences'], 1)),
+                            np.asarray(features['max_divergence'], dtype=np.float64)])
+
+
+def predict(model: dict, target: str, features: dict) -> np.ndarray:
+    """Predicts a target (cpu_time_s or max_rss_mb) for every community."""
+    coefficients = model[target]
+    weights = np.array([coefficients['intercept']] + [coefficients[feature] for feature in FEATURES])
+    return np.exp(design_matrix(features) @ weights)
+
+
+def wall_time(model: dict, cpu_time: np.ndarray, threads: np.ndarray) -> np.ndarray:
+    """Predicts the wall time of a job from its CPU time and threads with Amdahl's law."""
+    serial = model['serial_fraction']
+    return cpu_time * (serial + (1 - serial) / threads)
+
+
+def community_features(seqpart_dir: str) -> dict:
+    """
+    Computes the features of every community of a sequence partitioning.
+
+    Args:
+        seqpart_dir (str): The seqpart directory with combined.fa.gz.fai, distances.tsv and the community lists.
+
+    Returns:
+        dict: Per feature, and for 'community' and 'index', a list with one value per community.
+    """
+    lengths = {}
+    with open(os.path.join(seqpart_dir, 'combined.fa.gz.fai')) as f:
+        for line in f:
+            name, length = line.split('\t')[:2]
+            lengths[name] = int(length)
+
+    prefix = os.path.join(seqpart_dir, 'distances.tsv.edges.weights.txt.community.')
+    indices = sorted(int(path[len(prefix):-len('.txt')]) for path in glob.glob(prefix + '*.txt'))
+    membership = {}
+    members = []
+    for index in indices:
+        with open(f'{prefix}{index}.txt') as f:
+            names = [line.strip() for line in f if line.strip()]
+        members.append(names)
+        for name in names:
+            membership[name] = len(members) - 1
+
+    # Largest mash distance within every community, in one pass over the all-vs-all table
+    max_divergence = np.zeros(len(members))
+    with open(os.path.join(seqpart_dir, 'distances.tsv')) as f:
+        for line in f:
+            name1, name2, distance = line.split('\t', 3)[:3]
+            community = membership.get(name1)
+            if community is not None and community == membership.get(name2):
+                max_divergence[community] = max(max_divergence[community], float(distance))
+
+    return {
+        'index': indices,
+        'community': [f'community{index}' for index in indices],
+        'sequences': [len(names) for names in members],
+        'total_bp': [sum(lengths.get(name, 0) for name in names) for names in members],
+        'max_length': [max((lengths.get(name, 0) for name in names), default=0) for names in members],
+        'max_divergence': max_divergence.tolist()
+    }
+
+
+def divide_threads(cpu_time: np.ndarray, total_threads: int, min_threads: int) -> np.ndarray:
+    """
+    Divides the thread budget over jobs that run at the same time, in proportion to their predicted CPU time. Every
+    job gets at least min_threads, and the threads left over by rounding down go to the longest job, so the threads
+    add up to exactly the budget as long as len(cpu_time) * min_threads <= total_threads.
+    """
+    share = cpu_time / cpu_time.sum() if cpu_time.sum() > 0 else np.full(len(cpu_time), 1 / len(cpu_time))
+    threads = np.maximum(np.floor(share * total_threads), min_threads).astype(np.int64)
+    while threads.sum() > total_threads and threads.max() > min_threads:
+        threads[np.argmax(threads)] -= 1
+    threads[np.argmax(cpu_time)] += max(0, total_threads - threads.sum())
+    return threads
+
+
+def allocate_threads(cpu_time: np.ndarray, memory_mb: np.ndarray, total_threads: int, total_memory_mb: float,
+                     min_threads: int) -> np.ndarray:
+    """
+    Divides the thread budget over groups of communities that can run at the same time. In order of decreasing
+    predicted CPU time, communities are added to a group until the next one no longer fits in memory or the group
+    has total_threads // min_threads members. The budget is then divided within every group, so the communities of
+    a group never ask for more than the budget together, and communities that have to run one after another get
+    the whole budget instead of a slice of it.
+    """
+    threads = np.zeros(len(cpu_time), dtype=np.int64)
+    min_threads = max(1, min(min_threads, total_threads))
+    max_group = max(1, total_threads // min_threads)
+
+    groups, group_memory = [[]], 0.0
+    for job in np.argsort(-cpu_time, kind='stable'):
+        job_memory = min(memory_mb[job], total_memory_mb)
+        if groups[-1] and (group_memory + job_memory > total_memory_mb or len(groups[-1]) == max_group):
+            groups.append([])
+            group_memory = 0.0
+        groups[-1].append(job)
+        group_memory += job_memory
+
+    for group in groups:
+        if group:
+            threads[group] = divide_threads(cpu_time[group], total_threads, min_threads)
+    return threads
+
+
+def peak_usage(start: np.ndarray, end: np.ndarray, usage: np.ndarray) -> float:
+    """Returns the highest total usage (e.g. threads) of the jobs running at any point of a schedule."""
+    if len(start) == 0:
+        return 0
+    # Sweep over the start and end times; at equal times, jobs end before the next ones start
+    times = np.concatenate([start, end])
+    deltas = np.concatenate([usage, -usage])
+    order = np.lexsort((deltas, times))
+    return np.cumsum(deltas[order]).max()
+
+
+def simulate_schedule(order: np.ndarray, threads: np.ndarray, memory_mb: np.ndarray, durations: np.ndarray,
+                      total_threads: int, total_memory_mb: float) -> tuple:
+    """
+    Simulates launching the jobs in order, each as soon as its threads and memory are free.
+
+    Jobs that need more memory than the machine has are started on their own, as run.sh would.
+
+    Returns:
+        tuple: The predicted start and end time of every job, in the units of durations.
+    """
+    start = np.zeros(len(order))
+    end = np.zeros(len(order))
+    running = []  # (end time, job)
+    now, free_threads, free_memory = 0.0, total_threads, total_memory_mb
+
+    for job in order:
+        needed_memory = min(memory_mb[job], total_memory_mb)
+        while running and (free_threads < threads[job] or free_memory < needed_memory):
+            now, finished = heapq.heappop(running)
+            free_threads += threads[finished]
+            free_memory += min(memory_mb[finished], total_memory_mb)
+
+        start[job], end[job] = now, now + durations[job]
+        free_threads -= threads[job]
+        free_memory -= needed_memory
+        heapq.heappush(running, (end[job], job))
+
+    return start, end
+
+
+def make_schedule(features: dict, model: dict, total_threads: int, total_memory_mb: float, min_threads: int = 2,
+                  max_hours: float = 24) -> tuple:
+    """
+    Predicts the cost of every community and plans the run.
+
+    Returns:
+        tuple: The preflight rows (features and predictions) and the schedule rows, both as lists of dicts, with the
+               schedule in launch order.
+    """
+    cpu_time = predict(model, 'cpu_time_s', features)
+    memory_mb = predict(model, 'max_rss_mb', features)
+    threads = allocate_threads(cpu_time, memory_mb, total_threads, total_memory_mb, min_threads)
+    durations = wall_time(model, cpu_time, threads)
+
+    # Longest processing time first keeps the long jobs off the end of the run
+    order = np.argsort(-durations, kind='stable')
+    start, end = simulate_schedule(order, threads, memory_mb, durations, total_threads, total_memory_mb)
+    if peak_usage(start, end, threads) > total_threads:
+        raise RuntimeError(f"The schedule uses more than the {total_threads} threads available")
+
+    preflight_rows = []
+    for i, community in enumerate(features['community']):
+        preflight_rows.append({**{column: features[column][i] for column in PREFLIGHT_COLUMNS[:5]},
+                               'cpu_time_s': round(cpu_time[i]), 'max_rss_mb': round(memory_mb[i])})
+
+    schedule_rows = []
+    for position, i in enumerate(order):
+        warnings = []
+        if memory_mb[i] > total_memory_mb:
+            warnings.append(f'needs {memory_mb[i] / 1024:.0f} GB of memory, more than the {total_memory_mb / 1024:.0f} GB available')
+        if durations[i] > max_hours * 3600:
+            warnings.append(f'runs about {durations[i] / 3600:.0f} h on {threads[i]} threads')
+        schedule_rows.append({
+            'index': features['index'][i], 'community': features['community'][i], 'threads': threads[i],
+            'memory_mb': int(np.ceil(min(memory_mb[i], total_memory_mb))), 'order': position,
+            'wall_time_h': round(durations[i] / 3600, 2), 'cpu_time_h': round(cpu_time[i] / 3600, 2),
+            'start_h': round(start[i] / 3600, 2), 'end_h': round(end[i] / 3600, 2), 'warning': '; '.join(warnings)
+        })
+
+    return preflight_rows, schedule_rows
+
+
+def write_rows(path: str, columns: list, rows: list):
+    """Writes rows of dicts as a TSV file."""
+    with open(path, 'w') as f:
+        f.write('\t'.join(columns) + '\n')
+        for row in rows:
+            f.write('\t'.join(str(row[column]) for column in columns) + '\n')
+
+
+def load_model(model_path: str) -> dict:
+    """Loads a calibrated model, or the built-in model if the file does not exist."""
+    if model_path and os.path.exists(model_path):
+        with open(model_path) as f:
+            return json.load(f)
+    return DEFAULT_MODEL
+
+
+def read_calibration_data(run_dir: str, rule: str) -> list:
+    """
+    Joins the preflight features of an earlier run with the measured resource usage of the rule per community.
+    Rules that reused a cached result (cache_hit in the telemetry) did not run the tool and are left out.
+
+    Args:
+        run_dir (str): The output directory of the run, with preflight/preflight.tsv and telemetry/run_resource_usage.tsv.
+        rule (str): The Snakemake rule the model predicts.
+
+    Returns:
+        list: (features, cpu_time_s, max_rss_mb) tuples, one per community with measurements.
+    """
+    usage = {}
+    with open(os.path.join(run_dir, 'telemetry', 'run_resource_usage.tsv')) as f:
+        for row in csv.DictReader(f, delimiter='\t'):
+            if row['rule'] == rule and row['cpu_time_s'] and row['max_rss_mb'] and row.get('cache_hit') != 'yes':
+                usage[row['community']] = (float(row['cpu_time_s']), float(row['max_rss_mb']))
+
+    samples = []
+    with open(os.path.join(run_dir, 'preflight', 'preflight.tsv')) as f:
+        for row in csv.DictReader(f, delimiter='\t'):
+            if row['community'] in usage and float(usage[row['community']][0]) > 0:
+                samples.append(({feature: float(row[feature]) for feature in FEATURES}, *usage[row['community']]))
+    return samples
+
+
+def calibrate(samples: list, model: dict) -> dict:
+    """
+    Refits the cost model on measured runs. With fewer samples than twice the number of coefficients, only the
+    intercepts are refitted and the slopes of the model are kept.
+
+    Args:
+        samples (list): (features, cpu_time_s, max_rss_mb) tuples from read_calibration_data.
+        model (dict): The model to start from.
+
+    Returns:
+        dict: The calibrated model.
+    """
+    features = {feature: [sample[0][feature] for sample in samples] for feature in FEATURES}
+    X = design_matrix(features)
+    calibrated = {**model, 'samples': len(samples)}
+
+    for target, column in (('cpu_time_s', 1), ('max_rss_mb', 2)):
+        y = np.log([sample[column] for sample in samples])
+        if len(samples) >= 2 * X.shape[1]:
+            weights = np.linalg.lstsq(X, y, rcond=None)[0]
+        else:
+            slopes = np.array([model[target][feature] for feature in FEATURES])
+            weights = np.concatenate([[np.mean(y - X[:, 1:] @ slopes)], slopes])
+        calibrated[target] = {'intercept': float(weights[0]),
+                              **{feature: float(weight) for feature, weight in zip(FEATURES, weights[1:])}}
+
+    return calibrated
+
+
+def machine_memory_mb() -> float:
+    """Returns the physical memory of the machine in MB."""
+    return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / (1 << 20)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estimates the cost of every community and schedules the pggb runs.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    schedule_parser = subparsers.add_parser('schedule', help="estimate the cost of the communities and plan the run")
+    schedule_parser.add_argument('seqpart_dir', help="seqpart directory of the run")
+    schedule_parser.add_argument('-t', '--threads', dest='threads', type=int, default=16, help="total thread budget [default: 16]")
+    schedule_parser.add_argument('-m', '--memory', dest='memory', type=float, default=None, help="memory budget in GB [default: the memory of the machine]")
+    schedule_parser.add_argument('--min-threads', dest='min_threads', type=int, default=2, help="fewest threads given to a community [default: 2]")
+    schedule_parser.add_argument('--max-hours', dest='max_hours', type=float, default=24, help="warn for communities predicted to run longer [default: 24]")
+    schedule_parser.add_argument('--model', dest='model', default='preflight_model.json', help="calibrated model, the built-in model is used if it does not exist [default: preflight_model.json]")
+    schedule_parser.add_argument('-o', '--output', dest='output', default='./', help="output directory for preflight.tsv and schedule.tsv [default: ./]")
+
+    calibrate_parser = subparsers.add_parser('calibrate', help="refit the cost model on earlier runs")
+    calibrate_parser.add_argument('run_dirs', nargs='+', help="output directories of earlier runs")
+    calibrate_parser.add_argument('--rule', dest='rule', default='pggb', help="Snakemake rule to model [default: pggb]")
+    calibrate_parser.add_argument('--model', dest='model', default='preflight_model.json', help="model to start from [default: preflight_model.json or the built-in model]")
+    calibrate_parser.add_argument('-o', '--output', dest='output', default='preflight_model.json', help="output model [default: preflight_model.json]")
+
+    args = parser.parse_args()
+    model = load_model(args.model)
+
+    if args.command == 'schedule':
+        memory_mb = args.memory * 1024 if args.memory else machine_memory_mb()
+        features = community_features(args.seqpart_dir)
+        preflight_rows, schedule_rows = make_schedule(features, model, args.threads, memory_mb, args.min_threads,
+                                                      args.max_hours)
+
+        os.makedirs(args.output, exist_ok=True)
+        write_rows(os.path.join(args.output, 'preflight.tsv'), PREFLIGHT_COLUMNS, preflight_rows)
+        write_rows(os.path.join(args.output, 'schedule.tsv'), SCHEDULE_COLUMNS, schedule_rows)
+
+        makespan = max((row['end_h'] for row in schedule_rows), default=0)
+        print(f"Scheduled {len(schedule_rows)} communities on {args.threads} threads; predicted run time {makespan:.1f} h")
+        for row in schedule_rows:
+            if row['warning']:
+                print(f"Warning: {row['community']} {row['warning']}", file=sys.stderr)
+    elif args.command == 'calibrate':
+        samples = [sample for run_dir in args.run_dirs for sample in read_calibration_data(run_dir, args.rule)]
+        if not samples:
+            sys.exit("Error: no communities with both preflight features and measured resource usage")
+        with open(args.output, 'w') as f:
+            json.dump(calibrate(samples, model), f, indent=2)
+        print(f"Calibrated the model on {len(samples)} communities: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -6,11 +6,28 @@ set -e
 output_dir="readmapping"
 threads=64
 
+function usage {
+  echo "Usage: $0 -i INPUT_DIR -f FASTQ_FILE [-f FASTQ_FILE] [options]"
+  echo "Aligns reads to the graph of every community in INPUT_DIR with vg giraffe."
+  echo "Options:"
+  echo "  -i INPUT_DIR    directory with the community*/ graphs of a run"
+  echo "  -f FASTQ_FILE   reads to align; give -f twice for paired-end reads"
+  echo "  -o OUTPUT_DIR   output directory, created in every community directory [default: readmapping]"
+  echo "  -t THREADS      total number of threads, shared by the parallel jobs [default: 64]"
+  echo "  -j JOBS         number of communities aligned at the same time, each with THREADS / JOBS threads"
+  echo "                  [default: THREADS / 8, at least 1]"
+  echo "  -c CACHE_DIR    directory the graph indexes are cached in, keyed on the hash of data.gfa"
+  echo "                  [default: INPUT_DIR/.vg_index_cache]"
+  echo "  -h              show this help"
+}
+
 # Parse command-line options
-while getopts ":o:t:f:i:" opt; do
+while getopts ":o:t:j:c:f:i:h" opt; do
   case $opt in
     o) output_dir="$OPTARG" ;;
     t) threads="$OPTARG" ;;
+    j) parallel_jobs="$OPTARG" ;;
+    c) cache_dir="$OPTARG" ;;
     f)
       if [ -z "$fastq_file1" ]; then
         fastq_file1="$OPTARG"
@@ -22,6 +39,7 @@ while getopts ":o:t:f:i:" opt; do
       fi
       ;;
     i) input_dir="$OPTARG" ;;
+    h) usage; exit 0 ;;
     \?) echo "Invalid option: -$OPTARG" >&2; exit 1 ;;
     :) echo "Option -$OPTARG requires an argument." >&2; exit 1 ;;
   esac
@@ -30,6 +48,7 @@ done
 # Check if input directory is provided
 if [ -z "$input_dir" ]; then
   echo "Error: Input directory (-i) is required."
+  usage
   exit 1
 fi
 
@@ -39,35 +58,141 @@ if [ -z "$fastq_file1" ] && [ -z "$fastq_file2" ]; then
   exit 1
 fi
 
-# Iterate through communities in the input directory
-for community_dir in "$input_dir"/*/; do
-  community=$(basename "$community_dir")
-  community_output_dir="$community/$output_dir"
+# Align several communities at once by default; a single vg giraffe job does not keep many threads busy
+parallel_jobs=${parallel_jobs:-$(( threads / 8 > 1 ? threads / 8 : 1 ))}
+
+if [[ $parallel_jobs -le 0 || $threads -lt $parallel_jobs ]]; then
+  echo "Error: Parallel jobs (-j) should be between 1 and the number of threads (-t)."
+  exit 1
+fi
+
+# Indexes are cached on the hash of data.gfa, so aligning a new read set does not index the graphs again
+cache_dir=$(readlink -f "${cache_dir:-${input_dir%/}/.vg_index_cache}")
+fastq_file1=${fastq_file1:+$(readlink -f "$fastq_file1")}
+fastq_file2=${fastq_file2:+$(readlink -f "$fastq_file2")}
+
+# Every community gets an equal share of the threads
+threads_per_job=$(( threads / parallel_jobs ))
+
+
+# The indexes that vg autoindex writes and that alignment uses; a cache entry is only valid if all of them exist
+index_files=(index.giraffe.gbz index.min index.dist index.xg)
+
+
+function index_complete {
+  # Function to check that a directory holds all indexes
+  # Parameters:
+  #   $1: Index directory
+
+  local index_file
+  for index_file in "${index_files[@]}"; do
+    if [ ! -s "${1}/${index_file}" ]; then
+      return 1
+    fi
+  done
+}
+
+
+function cached_index {
+  # Function to get the giraffe, XG, distance and minimizer indexes of a graph
+  # Builds them in the cache if this graph was not indexed before
+  # Parameters:
+  #   $1: GFA file
+  #   $2: Number of threads
+  # Prints the cache directory holding the indexes
+
+  local gfa=$(readlink -f "$1")
+  local threads="$2"
+  local key=$(sha256sum "$gfa" | cut -d' ' -f1)
+  local entry="${cache_dir}/${key}"
+
+  mkdir -p "$cache_dir"
+
+  # The lock stops two runs from indexing the same graph at the same time
+  # set -e does not apply here, as this runs in a command substitution, so every failure is handled explicitly
+  (
+    flock 9 || exit 1
+    if ! index_complete "$entry"; then
+      echo "Indexing $gfa" >&2
+      local tmp_entry
+      tmp_entry=$(mktemp -d "${cache_dir}/.${key}.XXXXXX") || exit 1
+      if ! (cd "$tmp_entry" && vg autoindex -w giraffe -g "$gfa" -t "$threads" -R XG) >&2 || \
+          ! index_complete "$tmp_entry"; then
+        echo "Error: indexing $gfa failed" >&2
+        rm -rf "$tmp_entry"
+        exit 1
+      fi
+      rm -rf "$entry" && mv "$tmp_entry" "$entry" || exit 1
+    else
+      echo "Using cached indexes of $gfa" >&2
+    fi
+  ) 9> "${entry}.lock" || return 1
+
+  echo "$entry"
+}
+
+
+function align_community {
+  # Function to align the reads to the graph of one community
+  # Parameters:
+  #   $1: Community directory containing data.gfa
+  #   $2: Number of threads
+
+  local community_dir="${1%/}"
+  local threads="$2"
+  local community=$(basename "$community_dir")
+  local community_output_dir="${community_dir}/${output_dir}"
 
   mkdir -p "$community_output_dir"  # Create readmapping directory for each community
 
-  # Perform your operations for each community
-  echo "Indexing $community"
-  cd $community_output_dir
-  vg autoindex -w giraffe -g "../data.gfa" -t "$threads" -R XG
-  echo "Aligning reads"
+  local index_dir
+  index_dir=$(cached_index "${community_dir}/data.gfa" "$threads")
+  cd "$community_output_dir"
+  ln -sf "$index_dir"/index.* .
 
+  echo "[$community] Aligning reads"
   if [ -n "$fastq_file1" ] && [ -n "$fastq_file2" ]; then
     # Paired-end reads
-    echo "Using paired-end reads"
+    echo "[$community] Using paired-end reads"
     vg giraffe -x index.xg -Z index.giraffe.gbz -m index.min -d index.dist -f "$fastq_file1" -f "$fastq_file2" -t "$threads" -o GAM > "aln.gam"
   elif [ -n "$fastq_file1" ]; then
     # Single-end reads
-    echo "Using single-end reads"
+    echo "[$community] Using single-end reads"
     vg giraffe -x index.xg -Z index.giraffe.gbz -m index.min -d index.dist -f "$fastq_file1" -t "$threads" -o GAM > "aln.gam"
   fi
 
-  echo "Packing"
+  echo "[$community] Packing"
   vg pack -x index.xg -g "aln.gam" -Q 5 -o "aln.pack"
 
-  echo "Calling"
+  echo "[$community] Calling"
   vg call index.xg -k "aln.pack" -a -d 1 -t "$threads" > "vg_calls.vcf"
+}
+
 
-  cd ../..  # Return to the main directory
-  sleep 5
+# Align the communities in the input directory, running up to $parallel_jobs at the same time
+launched=0
+finished=0
+failed=0
+for community_dir in "$input_dir"/*/; do
+  if [ ! -f "${community_dir}data.gfa" ]; then
+    continue
+  fi
+
+  ( align_community "$community_dir" "$threads_per_job" ) &
+  launched=$(( launched + 1 ))
+
+  if (( launched - finished >= parallel_jobs )); then
+    wait -n || failed=$(( failed + 1 ))
+    finished=$(( finished + 1 ))
+  fi
+done
+
+while (( finished < launched )); do
+  wait -n || failed=$(( failed + 1 ))
+  finished=$(( finished + 1 ))
 done
+
+if [ "$failed" -ne 0 ]; then
+  echo "Error: Read alignment failed for $failed communities."
+  exit 1
+fi
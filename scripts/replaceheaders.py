@@ -1,67 +1,146 @@
-def extract_fasta_headers(fasta_file):
+import os
+import shutil
+import argparse
+import concurrent.futures
+
+# Output buffer size; the GFF is written as it is read
+BUFFER_SIZE = 1 << 20
+
+
+def extract_contig_names(sequence_file):
+    """
+    Reads the contig names of a genome, in file order, from its FASTA headers or from its samtools .fai index.
+    The name is the first word of the header, as used by samtools and vg.
+
+    Args:
+        sequence_file (str): Path to the FASTA file or its .fai index.
+
+    Returns:
+        list: The contig names.
+    """
     headers = []
-    with open(fasta_file, 'r') as file:
-        for line in file:
-            if line.startswith('>'):
-                header = line[1:].strip()  # Remove '>' and any trailing newline
-                headers.append(header)
+    with open(sequence_file, 'r') as file:
+        if sequence_file.endswith('.fai'):
+            for line in file:
+                if line.strip():
+                    headers.append(line.split('\t', 1)[0])
+        else:
+            for line in file:
+                if line.startswith('>'):
+                    headers.append((line[1:].split(None, 1) or [''])[0])  # Remove '>' and the description
     return headers
 
-def replace_gff_chromosomes_v1(gff_file, new_headers, output_file):
-    with open(gff_file, 'r') as file:
-        gff_lines = file.readlines()
-
-    with open(output_file, 'w') as outfile:
-        for line in gff_lines:
-            if not line.startswith('#') and line.strip():  # Skip comments and empty lines
-                parts = line.split('\t')
-                scaffold_number = parts[0].split('_')[1]  # Assuming the format is 'scaffold_1', 'scaffold_2', etc.
-                try:
-                    scaffold_index = int(scaffold_number) - 1  # Convert to zero-based index
-                    parts[0] = new_headers[scaffold_index]  # Replace chromosome name
-                except (IndexError, ValueError):
-                    pass  # Skip lines with unexpected format
-                outfile.write('\t'.join(parts))
-            else:
-                outfile.write(line)
 
-def replace_gff_chromosomes_v2(gff_file, new_headers, output_file):
-    with open(gff_file, 'r') as file:
-        gff_lines = file.readlines()
+def replace_gff_chromosomes(gff_file, new_headers, output_file, mode='order'):
+    """
+    Streams a GFF file and replaces its chromosome names.
+
+    Args:
+        gff_file (str): Path to the input GFF.
+        new_headers (list): The new chromosome names.
+        output_file (str): Path to the output GFF.
+        mode (str): 'order' maps the n-th distinct chromosome in the GFF to the n-th new name; chromosomes beyond
+                    the number of new names keep their name. 'index' maps scaffold_N to the N-th new name.
 
-    header_index = 0
+    Returns:
+        tuple: The output file and the number of chromosomes renamed.
+    """
     chromosome_map = {}
+    in_fasta_section = False
 
-    # Create a map for old chromosome names to new ones
-    for line in gff_lines:
-        if not line.startswith('#') and line.strip():
-            parts = line.split('\t')
+    with open(gff_file, 'r') as infile, open(output_file, 'w', buffering=BUFFER_SIZE) as outfile:
+        for line in infile:
+            if in_fasta_section or line.startswith('#') or not line.strip():  # Skip comments and empty lines
+                in_fasta_section = in_fasta_section or line.startswith('##FASTA')
+                outfile.write(line)
+                continue
+
+            parts = line.split('\t', 1)
             chromosome = parts[0]
             if chromosome not in chromosome_map:
-                if header_index < len(new_headers):
-                    chromosome_map[chromosome] = new_headers[header_index]
-                    header_index += 1
-                else:
-                    break  # Stop if we run out of new headers
-
-    # Replace the chromosome names in the GFF
-    with open(output_file, 'w') as outfile:
-        for line in gff_lines:
-            if not line.startswith('#') and line.strip():
-                parts = line.split('\t')
-                chromosome = parts[0]
-                if chromosome in chromosome_map:
-                    parts[0] = chromosome_map[chromosome]
-                outfile.write('\t'.join(parts))
-            else:
-                outfile.write(line)
+                chromosome_map[chromosome] = new_chromosome_name(chromosome, len(chromosome_map), new_headers, mode)
+            parts[0] = chromosome_map[chromosome]
+            outfile.write('\t'.join(parts))
+
+    renamed = sum(1 for old, new in chromosome_map.items() if old != new)
+    return output_file, renamed
+
+
+def new_chromosome_name(chromosome, order, new_headers, mode):
+    """
+    Picks the new name of a chromosome.
+
+    Args:
+        chromosome (str): The chromosome name in the GFF.
+        order (int): The number of distinct chromosomes seen before this one.
+        new_headers (list): The new chromosome names.
+        mode (str): 'order' or 'index', see replace_gff_chromosomes.
+
+    Returns:
+        str: The new name, or the old name if there is none.
+    """
+    if mode == 'index':
+        try:
+            scaffold_index = int(chromosome.split('_')[1]) - 1  # Assuming the format is 'scaffold_1', 'scaffold_2', etc.
+            if 0 <= scaffold_index < len(new_headers):
+                return new_headers[scaffold_index]
+        except (IndexError, ValueError):
+            pass  # Keep names with an unexpected format
+        return chromosome
+
+    return new_headers[order] if order < len(new_headers) else chromosome
+
+
+def remap_pair(sequence_file, gff_file, output_file, mode='order'):
+    """Renames the chromosomes of one annotation after the contigs of its genome."""
+    return replace_gff_chromosomes(gff_file, extract_contig_names(sequence_file), output_file, mode)
+
+
+def read_batch_file(batch_file):
+    """
+    Reads a tab-separated file of FASTA (or .fai), GFF and output paths, one genome per line.
+
+    Args:
+        batch_file (str): Path to the batch file.
+
+    Returns:
+        list: (sequence_file, gff_file, output_file) tuples.
+    """
+    pairs = []
+    with open(batch_file) as f:
+        for line in f:
+            if line.startswith('#') or not line.strip():
+                continue
+            sequence_file, gff_file, output_file = line.rstrip('\n').split('\t')[:3]
+            pairs.append((sequence_file, gff_file, output_file))
+    return pairs
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Renames the chromosomes in GFF files after the contigs of their genome.")
+    parser.add_argument('sequence_file', nargs='?', default='sequences.fa', help="genome FASTA or its .fai index [default: sequences.fa]")
+    parser.add_argument('gff_file', nargs='?', default='genes.gff', help="annotation to rename [default: genes.gff]")
+    parser.add_argument('output_file', nargs='?', default='updated_genes.gff', help="renamed annotation [default: updated_genes.gff]")
+    parser.add_argument('-m', '--mode', dest='mode', choices=['order', 'index'], default='order', help="'order': n-th GFF chromosome gets the n-th contig name; 'index': scaffold_N gets the N-th contig name [default: order]")
+    parser.add_argument('-b', '--batch', dest='batch', default=None, help="tab-separated file of FASTA (or .fai), GFF and output paths, one genome per line")
+    parser.add_argument('-c', '--combined', dest='combined', default=None, help="also concatenate all outputs into this file, e.g. combined.gff for vg annotate")
+    parser.add_argument('-t', '--threads', dest='threads', type=int, default=os.cpu_count(), help="number of genomes processed in parallel in batch mode [default: all CPUs]")
+    args = parser.parse_args()
+
+    if args.batch:
+        pairs = read_batch_file(args.batch)
+    else:
+        pairs = [(args.sequence_file, args.gff_file, args.output_file)]
 
-# Replace 'sequences.fa' and 'genes.gff' with your actual file paths
-fasta_headers = extract_fasta_headers('sequences.fa')
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max(1, min(args.threads, len(pairs)))) as executor:
+        futures = [executor.submit(remap_pair, *pair, args.mode) for pair in pairs]
+        for future in futures:
+            output_file, renamed = future.result()
+            print(f"{output_file}: renamed {renamed} chromosomes")
 
-# Check which method to use based on the headers
-# You can add more conditions if needed
-if len(fasta_headers) == 0:  # Change this condition based on your criteria
-    replace_gff_chromosomes_v1('genes.gff', fasta_headers, 'updated_genes.gff')
-else:
-    replace_gff_chromosomes_v2('genes.gff', fasta_headers, 'updated_genes.gff')
+    if args.combined:
+        with open(args.combined, 'wb') as combined:
+            for _, _, output_file in pairs:
+                with open(output_file, 'rb') as f:
+                    shutil.copyfileobj(f, combined, BUFFER_SIZE)
+        print(f"Combined {len(pairs)} annotations into {args.combined}")
@@ -1,39 +1,125 @@
-from Bio import SeqIO
+import os
 import sys
+import argparse
+import concurrent.futures
 
-# Check if three arguments are provided
-if len(sys.argv) != 3:
-    print("Usage: {} signalp_output_file proteins_file".format(sys.argv[0]))
-    sys.exit(1)
+# Minimum length for protein sequences
+MIN_LENGTH = 10
 
-# Assigning command line arguments to variables
-signalp_output_file = sys.argv[1]
-proteins_file = sys.argv[2]
+# Output buffer size; secreted proteins are written in large blocks instead of one record at a time
+BUFFER_SIZE = 1 << 20
 
-# Store secreted protein IDs
-secreted_proteins = set()
 
-# Read secreted protein IDs from SignalP output file
-with open(signalp_output_file, 'r') as file:
-    for line in file:
-        # Skip header lines and empty lines
-        if line.startswith('#') or not line.strip():
-            continue
+def read_secreted_ids(signalp_output_file):
+    """
+    Reads the ids of the proteins predicted to be secreted (SP(Sec/SPI)) from a SignalP output file.
 
-        # Split the line into columns
-        parts = line.split()
-        protein_id = parts[0]
-        prediction = parts[1]
+    Args:
+        signalp_output_file (str): Path to the SignalP output file.
 
-        # Check if the protein is predicted to be secreted (SP(Sec/SPI))
-        if prediction == 'SP(Sec/SPI)':
-            secreted_proteins.add(protein_id)
+    Returns:
+        set: The secreted protein ids.
+    """
+    secreted_proteins = set()
+    with open(signalp_output_file, 'r') as file:
+        for line in file:
+            # Skip header lines and empty lines
+            if line.startswith('#') or not line.strip():
+                continue
 
-# Minimum length for protein sequences
-MIN_LENGTH = 10
+            # Split the line into columns
+            parts = line.split()
+            protein_id = parts[0]
+            prediction = parts[1]
+
+            # Check if the protein is predicted to be secreted (SP(Sec/SPI))
+            if prediction == 'SP(Sec/SPI)':
+                secreted_proteins.add(protein_id)
+
+    return secreted_proteins
+
+
+def extract_secreted(signalp_output_file, proteins_file, output_file):
+    """
+    Writes the secreted proteins of a proteome to a FASTA file in a single pass over the proteome.
+    Only the headers are inspected; the sequence lines of other proteins are skipped without being stored.
+
+    Args:
+        signalp_output_file (str): Path to the SignalP output file.
+        proteins_file (str): Path to the protein FASTA file.
+        output_file (str): Path to the output FASTA file.
+
+    Returns:
+        tuple: The output file and the number of proteins written.
+    """
+    secreted_proteins = read_secreted_ids(signalp_output_file)
+    written = 0
+
+    with open(proteins_file, 'r') as proteins, open(output_file, 'w', buffering=BUFFER_SIZE) as secreted_file:
+        header = None
+        sequence_lines = []
+
+        def write_record():
+            nonlocal written
+            if header is not None and sum(len(line.strip()) for line in sequence_lines) >= MIN_LENGTH:
+                secreted_file.write(header)
+                secreted_file.writelines(sequence_lines)
+                written += 1
+
+        for line in proteins:
+            if line.startswith('>'):
+                write_record()
+                protein_id = (line[1:].split(None, 1) or [''])[0]
+                header = line if protein_id in secreted_proteins else None
+                sequence_lines = []
+            elif header is not None:
+                sequence_lines.append(line if line.endswith('\n') else line + '\n')
+        write_record()
+
+    return output_file, written
+
+
+def read_batch_file(batch_file):
+    """
+    Reads a tab-separated file of SignalP output, proteome and (optionally) output paths, one pair per line.
+    Without an output path, the secreted proteins are written next to the proteome as <proteome>.secreted.fasta.
+
+    Args:
+        batch_file (str): Path to the batch file.
+
+    Returns:
+        list: (signalp, proteins, output) tuples.
+    """
+    pairs = []
+    with open(batch_file) as f:
+        for line in f:
+            if line.startswith('#') or not line.strip():
+                continue
+            parts = line.rstrip('\n').split('\t')
+            signalp, proteins = parts[0], parts[1]
+            output = parts[2] if len(parts) > 2 and parts[2] else os.path.splitext(proteins)[0] + '.secreted.fasta'
+            pairs.append((signalp, proteins, output))
+
+    return pairs
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Extracts the proteins that SignalP predicts to be secreted.")
+    parser.add_argument('signalp_output_file', nargs='?', help="SignalP output file")
+    parser.add_argument('proteins_file', nargs='?', help="protein FASTA file")
+    parser.add_argument('-o', '--output', dest='output', default='secreted_proteins.fasta', help="output FASTA file [default: secreted_proteins.fasta]")
+    parser.add_argument('-b', '--batch', dest='batch', default=None, help="tab-separated file of signalp_output, proteins and optional output paths, one pair per line")
+    parser.add_argument('-t', '--threads', dest='threads', type=int, default=os.cpu_count(), help="number of pairs processed in parallel in batch mode [default: all CPUs]")
+    args = parser.parse_args()
+
+    if args.batch:
+        pairs = read_batch_file(args.batch)
+    elif args.signalp_output_file and args.proteins_file:
+        pairs = [(args.signalp_output_file, args.proteins_file, args.output)]
+    else:
+        parser.print_usage()
+        sys.exit(1)
 
-# Filter protein sequences and write secreted proteins to a new file
-with open(proteins_file, 'r') as proteins, open('secreted_proteins.fasta', 'w') as secreted_file:
-    for record in SeqIO.parse(proteins, 'fasta'):
-        if record.id in secreted_proteins and len(record.seq) >= MIN_LENGTH:
-            SeqIO.write(record, secreted_file, 'fasta')
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max(1, min(args.threads, len(pairs)))) as executor:
+        for output_file, written in executor.map(extract_secreted, *zip(*pairs)):
+            print(f"{output_file}: {written} secreted proteins")
@@ -0,0 +1,306 @@
+"""
+Benchmark of the sequence partitioning steps on synthetic data with planted communities.
+
+For every requested number of contigs, the contigs are split over a number of planted communities and the inputs of
+the partitioning are generated: an all-vs-all mash distance table (close within a community, mostly distant between
+communities), a wfmash-like PAF file and a bgzipped FASTA. The steps of run_seqpart and run.sh are then run as
+separate processes and timed, with their CPU time and peak memory taken from os.wait4:
+    mash2net            mash2net.py on the distance table
+    paf2net             paf2net.py on the PAF file
+    graph_construction  reading the mash network into igraph (timed inside the leiden process)
+    leiden              community_leiden as in net2communities.py (timed inside the leiden process)
+    net2communities     net2communities.py end to end, checked against the planted communities
+    community_fasta     samtools faidx | bgzip of every community, as in run.sh
+
+Recovery is reported as the normalized mutual information (NMI) between the planted and the detected communities,
+where 1 is a perfect recovery. Steps whose tools are not installed (igraph, samtools, bgzip) are reported as skipped.
+Every row is appended to the results file with the date and git commit, so results of different versions can be
+compared.
+
+Usage:
+    python3 seqpart_bench.py -s 500 1000 5000 -k 10 -o seqpart_bench.tsv
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import datetime
+import tempfile
+import subprocess
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+RESULT_COLUMNS = ['date', 'commit', 'contigs', 'planted_communities', 'step', 'status', 'wall_time_s', 'cpu_time_s',
+                  'max_rss_mb', 'communities_found', 'nmi']
+
+
+def plant_communities(contig_count: int, community_count: int, rng: np.random.Generator) -> np.ndarray:
+    """Assigns every contig to one of the planted communities, with community sizes differing by at most one."""
+    return rng.permutation(np.arange(contig_count) % community_count)
+
+
+def contig_names(contig_count: int, genome_count: int = 10) -> list:
+    """Names the contigs in PanSN format, spread over a number of genomes."""
+    return [f'genome{i % genome_count}#1#contig{i}' for i in range(contig_count)]
+
+
+def write_mash_table(mash_path: str, names: list, labels: np.ndarray, rng: np.random.Generator):
+    """
+    Writes an all-vs-all table in `mash dist` format: distances of 0.005-0.05 within a community and 0.2-1 between
+    communities, so some noise edges between communities pass the 0.4 cut-off of mash2net.py.
+    """
+    with open(mash_path, 'w') as f:
+        for i, name in enumerate(names):
+            same = labels == labels[i]
+            distances = np.where(same, rng.uniform(0.005, 0.05, len(names)), rng.uniform(0.2, 1.0, len(names)))
+            distances[i] = 0
+            shared = np.rint(1000 * (1 - distances)).astype(np.int64)
+            f.write(''.join(f'{name}\t{other}\t{distance:.6g}\t0\t{hashes}/1000\n'
+                            for other, distance, hashes in zip(names, distances, shared)))
+
+
+def write_paf(paf_path: str, names: list, labels: np.ndarray, contig_length: int, rng: np.random.Generator,
+              mappings_per_contig: int = 5):
+    """
+    Writes wfmash-like mappings: every contig maps to a few contigs of its own community and, rarely, to another one.
+    """
+    members = [np.flatnonzero(labels == label) for label in range(labels.max() + 1)]
+    with open(paf_path, 'w') as f:
+        for i, name in enumerate(names):
+            targets = rng.choice(members[labels[i]], size=mappings_per_contig)
+            if rng.random() < 0.05:
+                targets[0] = rng.integers(len(names))
+            for j in targets[targets != i]:
+                length = int(rng.integers(contig_length // 10, contig_length))
+                identity = rng.uniform(70, 80) if labels[j] != labels[i] else rng.uniform(95, 100)
+                f.write(f'{name}\t{contig_length}\t0\t{length}\t+\t{names[j]}\t{contig_length}\t0\t{length}\t'
+                        f'{int(length * identity / 100)}\t{length}\t60\tid:f:{identity:.4f}\n')
+
+
+def write_fasta(fasta_path: str, names: list, contig_length: int, rng: np.random.Generator):
+    """Writes random contig sequences, 80 bases per line."""
+    bases = np.frombuffer(b'ACGT', dtype=np.uint8)
+    with open(fasta_path, 'w') as f:
+        for name in names:
+            sequence = bases[rng.integers(4, size=contig_length)].tobytes().decode()
+            f.write(f'>{name}\n')
+            f.write(''.join(sequence[k:k + 80] + '\n' for k in range(0, contig_length, 80)))
+
+
+def run_timed(command: list, cwd: str = None, stdout=subprocess.DEVNULL) -> dict:
+    """
+    Runs a command and measures it.
+
+    Args:
+        command (list): The command and its arguments.
+        cwd (str): The working directory.
+        stdout: Where the standard output of the command goes.
+
+    Returns:
+        dict: The status, wall time, CPU time (user + system) and peak RSS of the command and its children.
+    """
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=cwd, stdout=stdout)
+    _, status, usage = os.wait4(process.pid, 0)
+    wall_time = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+
+    return {
+        'status': 'ok' if process.returncode == 0 else f'failed ({process.returncode})',
+        'wall_time_s': round(wall_time, 3),
+        'cpu_time_s': round(usage.ru_utime + usage.ru_stime, 3),
+        'max_rss_mb': round(usage.ru_maxrss / 1024, 1)  # ru_maxrss is in KB on Linux
+    }
+
+
+def leiden_timings(edge_list: str, edge_weights: str, accurate: bool = False):
+    """
+    Builds the mash network and detects its communities like net2communities.py, printing the time of both parts as JSON.
+    """
+    start = time.perf_counter()
+    import igraph as ig
+    weight_list = [float(x) for x in open(edge_weights).read().strip().split('\n')]
+    g = ig.read(filename=edge_list, format='edgelist', directed=False)
+    built = time.perf_counter()
+
+    partition = g.community_leiden(objective_function='modularity', n_iterations=120 if accurate else 60,
+                                   weights=weight_list)
+    detected = time.perf_counter()
+
+    print(json.dumps({'graph_construction': round(built - start, 3), 'leiden': round(detected - built, 3),
+                      'communities': len(partition)}))
+
+
+def read_communities(prefix: str, names: list) -> np.ndarray:
+    """
+    Reads the community files written by net2communities.py. Contigs without a community (no edges in the network)
+    each get a community of their own.
+    """
+    labels = np.full(len(names), -1, dtype=np.int64)
+    index = {name: i for i, name in enumerate(names)}
+    community = 0
+    while os.path.exists(f'{prefix}.community.{community}.txt'):
+        with open(f'{prefix}.community.{community}.txt') as f:
+            for line in f:
+                labels[index[line.strip()]] = community
+        community += 1
+
+    missing = np.flatnonzero(labels < 0)
+    labels[missing] = community + np.arange(len(missing))
+    return labels
+
+
+def normalized_mutual_information(labels_a: np.ndarray, labels_b: np.ndarray) -> float:
+    """Returns the normalized mutual information (arithmetic mean normalization) of two labellings."""
+    _, a = np.unique(labels_a, return_inverse=True)
+    _, b = np.unique(labels_b, return_inverse=True)
+    contingency = np.zeros((a.max() + 1, b.max() + 1))
+    np.add.at(contingency, (a, b), 1)
+    joint = contingency / len(a)
+
+    pa, pb = joint.sum(axis=1), joint.sum(axis=0)
+    nonzero = joint > 0
+    mutual_information = np.sum(joint[nonzero] * np.log(joint[nonzero] / np.outer(pa, pb)[nonzero]))
+    entropy_a = -np.sum(pa * np.log(pa))
+    entropy_b = -np.sum(pb * np.log(pb))
+    if entropy_a + entropy_b == 0:
+        return 1.0
+    return float(2 * mutual_information / (entropy_a + entropy_b))
+
+
+def benchmark_size(work_dir: str, contig_count: int, community_count: int, contig_length: int,
+                   rng: np.random.Generator) -> list:
+    """
+    Generates the data for one size and benchmarks every step on it.
+
+    Returns:
+        list: One result dict per step.
+    """
+    names = contig_names(contig_count)
+    labels = plant_communities(contig_count, community_count, rng)
+    mash_path = os.path.join(work_dir, 'distances.tsv')
+    paf_path = os.path.join(work_dir, 'mappings.paf')
+    fasta_path = os.path.join(work_dir, 'combined.fa')
+
+    print(f"Generating {contig_count} contigs in {community_count} communities...")
+    write_mash_table(mash_path, names, labels, rng)
+    write_paf(paf_path, names, labels, contig_length, rng)
+    write_fasta(fasta_path, names, contig_length, rng)
+
+    results = []
+
+    def record(step, result):
+        results.append({'step': step, **result})
+        print(f"  {step}: {result.get('status')}, {result.get('wall_time_s', '-')} s, {result.get('max_rss_mb', '-')} MB")
+
+    record('mash2net', run_timed([sys.executable, os.path.join(SCRIPT_DIR, 'mash2net.py'), '-m', mash_path]))
+    record('paf2net', run_timed([sys.executable, os.path.join(SCRIPT_DIR, 'paf2net.py'), '-p', paf_path]))
+
+    edges, weights, vertices = (mash_path + '.edges.list.txt', mash_path + '.edges.weights.txt',
+                                mash_path + '.vertices.id2name.txt')
+    try:
+        import igraph  # noqa: F401
+        has_igraph = True
+    except ImportError:
+        has_igraph = False
+
+    if has_igraph:
+        timings_path = os.path.join(work_dir, 'leiden.json')
+        with open(timings_path, 'w') as timings_file:
+            result = run_timed([sys.executable, os.path.abspath(__file__), '--leiden', edges, weights],
+                               stdout=timings_file)
+        if result['status'] == 'ok':
+            with open(timings_path) as timings_file:
+                timings = json.load(timings_file)
+            # Peak memory and CPU time are of the whole process, so they are reported on the leiden row
+            record('graph_construction', {'status': 'ok', 'wall_time_s': timings['graph_construction']})
+            record('leiden', {**result, 'wall_time_s': timings['leiden'], 'communities_found': timings['communities']})
+        else:
+            record('leiden', result)
+
+        result = run_timed([sys.executable, os.path.join(SCRIPT_DIR, 'net2communities.py'),
+                            '-e', edges, '-w', weights, '-n', vertices])
+        if result['status'] == 'ok':
+            detected = read_communities(weights, names)
+            result['communities_found'] = len(np.unique(detected))
+            result['nmi'] = round(normalized_mutual_information(labels, detected), 4)
+        record('net2communities', result)
+    else:
+        for step in ('graph_construction', 'leiden', 'net2communities'):
+            record(step, {'status': 'skipped (no igraph)'})
+
+    if shutil.which('samtools') and shutil.which('bgzip'):
+        # Same commands as the community loop of run.sh, on the planted communities
+        subprocess.run(['bgzip', '-f', fasta_path], check=True)
+        commands = []
+        for community in range(community_count):
+            list_path = os.path.join(work_dir, f'planted.{community}.txt')
+            with open(list_path, 'w') as f:
+                f.write(''.join(f'{names[i]}\n' for i in np.flatnonzero(labels == community)))
+            commands.append(f'samtools faidx {fasta_path}.gz $(cat {list_path}) | '
+                            f'bgzip -@ 4 -c > {work_dir}/community.{community}.fa.gz')
+        subprocess.run(['samtools', 'faidx', fasta_path + '.gz'], check=True)
+        record('community_fasta', run_timed(['bash', '-c', 'set -e\n' + '\n'.join(commands)]))
+    else:
+        record('community_fasta', {'status': 'skipped (no samtools/bgzip)'})
+
+    return results
+
+
+def git_commit() -> str:
+    """Returns the short commit hash of the repository, or an empty string outside a git checkout."""
+    result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=SCRIPT_DIR, stdout=subprocess.PIPE,
+                            stderr=subprocess.DEVNULL, text=True)
+    return result.stdout.strip() if result.returncode == 0 else ''
+
+
+def append_results(results_path: str, rows: list):
+    """Appends result rows to a TSV file, writing the header if the file is new."""
+    new_file = not os.path.exists(results_path) or os.path.getsize(results_path) == 0
+    with open(results_path, 'a') as f:
+        if new_file:
+            f.write('\t'.join(RESULT_COLUMNS) + '\n')
+        for row in rows:
+            f.write('\t'.join(str(row.get(column, '')) for column in RESULT_COLUMNS) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks the sequence partitioning on synthetic data with planted communities.")
+    parser.add_argument('-s', '--sizes', dest='sizes', type=int, nargs='+', default=[500, 1000, 2000], help="numbers of contigs to benchmark [default: 500 1000 2000]")
+    parser.add_argument('-k', '--communities', dest='communities', type=int, default=10, help="number of planted communities [default: 10]")
+    parser.add_argument('-l', '--contig-length', dest='contig_length', type=int, default=10000, help="length of the synthetic contigs [default: 10000]")
+    parser.add_argument('-o', '--output', dest='output', default='seqpart_bench.tsv', help="results file, appended to [default: seqpart_bench.tsv]")
+    parser.add_argument('-w', '--work-dir', dest='work_dir', default=None, help="keep the generated data in this directory [default: a temporary directory]")
+    parser.add_argument('--seed', dest='seed', type=int, default=42, help="random seed [default: 42]")
+    parser.add_argument('--leiden', dest='leiden', nargs=2, metavar=('EDGES', 'WEIGHTS'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.leiden:
+        leiden_timings(*args.leiden)
+        return
+
+    rng = np.random.default_rng(args.seed)
+    date = datetime.datetime.now().isoformat(timespec='seconds')
+    commit = git_commit()
+
+    for size in args.sizes:
+        if args.work_dir:
+            work_dir = os.path.join(args.work_dir, f'contigs{size}')
+            os.makedirs(work_dir, exist_ok=True)
+            results = benchmark_size(work_dir, size, args.communities, args.contig_length, rng)
+        else:
+            with tempfile.TemporaryDirectory(prefix='seqpart_bench.') as work_dir:
+                results = benchmark_size(work_dir, size, args.communities, args.contig_length, rng)
+
+        append_results(args.output, [{'date': date, 'commit': commit, 'contigs': size,
+                                      'planted_communities': args.communities, **row} for row in results])
+
+    print(f"Results appended to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+"""
+Concatenates trimmed ortholog alignments into a supermatrix.
+
+Every alignment is read once, in parallel, and copied into one pre-sized buffer per taxon. Taxa missing from a locus
+are padded with gaps, so all rows of the supermatrix have the same length and stay aligned. Next to the supermatrix
+a RAxML-style partition file and a per-locus occupancy table are written.
+
+Taxa are named after the first word of the FASTA headers, so the headers should be the genome names.
+
+Usage:
+    python3 supermatrix.py ALIGN_DIR OUTPUT [--orthologs orthologs.txt] [-t THREADS]
+"""
+
+import os
+import sys
+import glob
+import argparse
+import concurrent.futures
+
+ALIGNMENT_EXTENSIONS = ('.fa', '.fasta', '.faa', '.fas')
+
+
+def locus_name(path):
+    """Returns the locus of an alignment or ortholog name, e.g. 10087at4890 for 10087at4890.trimmed.fa."""
+    return os.path.basename(path).split('.')[0]
+
+
+def find_alignments(align_dir, orthologs=None):
+    """
+    Finds the alignment files in a directory, optionally limited to a list of orthologs.
+
+    Args:
+        align_dir (str): Directory containing one alignment per locus.
+        orthologs (list): Ortholog names to include, e.g. from orthologfinder. Extensions are ignored.
+
+    Returns:
+        list: The alignment paths, sorted by locus name.
+    """
+    alignments = {}
+    for path in glob.glob(os.path.join(align_dir, '*')):
+        if path.endswith(ALIGNMENT_EXTENSIONS):
+            alignments.setdefault(locus_name(path), path)
+
+    if orthologs is not None:
+        missing = [name for name in orthologs if name not in alignments]
+        if missing:
+            print(f"Warning: no alignment found for {len(missing)} orthologs, e.g. {missing[0]}", file=sys.stderr)
+        selected = set(orthologs)
+        alignments = {name: path for name, path in alignments.items() if name in selected}
+
+    return [alignments[name] for name in sorted(alignments)]
+
+
+def read_alignment(path):
+    """
+    Reads one alignment.
+
+    Args:
+        path (str): Path to the aligned FASTA file.
+
+    Returns:
+        tuple: The locus name, the alignment length and a dict of taxon to aligned sequence.
+    """
+    sequences = {}
+    taxon = None
+    parts = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith('>'):
+                if taxon is not None:
+                    sequences[taxon] = ''.join(parts)
+                taxon = (line[1:].split(None, 1) or [''])[0]
+                if taxon in sequences:
+                    raise ValueError(f"{path}: taxon {taxon} occurs more than once")
+                parts = []
+            elif line:
+                parts.append(line)
+    if taxon is not None:
+        sequences[taxon] = ''.join(parts)
+
+    lengths = {len(sequence) for sequence in sequences.values()}
+    if len(lengths) > 1:
+        raise ValueError(f"{path}: sequences have different lengths {sorted(lengths)}; is it aligned?")
+
+    return locus_name(path), lengths.pop() if lengths else 0, sequences
+
+
+def build_supermatrix(alignment_paths, threads=None):
+    """
+    Builds the supermatrix of a set of alignments.
+
+    Args:
+        alignment_paths (list): Paths to the alignments, in the order they should be concatenated.
+        threads (int): Number of processes reading alignments. Defaults to the number of CPUs.
+
+    Returns:
+        tuple: A dict of taxon to sequence (bytearray), the (locus, start, end) partitions with 1-based inclusive
+               coordinates, and the (locus, length, taxa) occupancy per locus.
+    """
+    with concurrent.futures.ProcessPoolExecutor(max_workers=threads) as executor:
+        loci = list(executor.map(read_alignment, alignment_paths, chunksize=16))
+
+    # Taxa in order of first appearance
+    taxa = {}
+    for _, _, sequences in loci:
+        for taxon in sequences:
+            taxa.setdefault(taxon, None)
+
+    total_length = sum(length for _, length, _ in loci)
+    supermatrix = {taxon: bytearray(b'-' * total_length) for taxon in taxa}
+
+    partitions = []
+    occupancy = []
+    start = 0
+    for locus, length, sequences in loci:
+        for taxon, sequence in sequences.items():
+            supermatrix[taxon][start:start + length] = sequence.encode()
+        partitions.append((locus, start + 1, start + length))
+        occupancy.append((locus, length, len(sequences)))
+        start += length
+
+    return supermatrix, partitions, occupancy
+
+
+def write_outputs(output, supermatrix, partitions, occupancy, datatype):
+    """
+    Writes the supermatrix FASTA, the partition file (<output>.partitions) and the occupancy table (<output>.occupancy.tsv).
+    """
+    with open(output, 'wb') as f:
+        for taxon, sequence in supermatrix.items():
+            f.write(b'>' + taxon.encode() + b'\n')
+            f.write(sequence)
+            f.write(b'\n')
+
+    with open(output + '.partitions', 'w') as f:
+        for locus, start, end in partitions:
+            f.write(f'{datatype}, {locus} = {start}-{end}\n')
+
+    taxa_count = len(supermatrix)
+    with open(output + '.occupancy.tsv', 'w') as f:
+        f.write('locus\tlength\ttaxa\toccupancy\n')
+        for locus, length, taxa in occupancy:
+            f.write(f'{locus}\t{length}\t{taxa}\t{taxa / taxa_count if taxa_count else 0:.4f}\n')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Concatenates trimmed ortholog alignments into a supermatrix.")
+    parser.add_argument('align_dir', help="directory with one trimmed alignment per locus")
+    parser.add_argument('output', help="output supermatrix FASTA")
+    parser.add_argument('-l', '--orthologs', dest='orthologs', default=None, help="file of ortholog names to include, one per line (e.g. orthologs.txt from orthologfinder)")
+    parser.add_argument('-d', '--datatype', dest='datatype', default='AA', help="data type written in the partition file [default: AA]")
+    parser.add_argument('-t', '--threads', dest='threads', type=int, default=None, help="number of processes reading alignments [default: all CPUs]")
+    args = parser.parse_args()
+
+    orthologs = None
+    if args.orthologs:
+        with open(args.orthologs) as f:
+            orthologs = [locus_name(line.strip()) for line in f if line.strip()]
+
+    alignment_paths = find_alignments(args.align_dir, orthologs)
+    if not alignment_paths:
+        print(f"Error: no alignments found in {args.align_dir}")
+        sys.exit(1)
+
+    supermatrix, partitions, occupancy = build_supermatrix(alignment_paths, args.threads)
+    write_outputs(args.output, supermatrix, partitions, occupancy, args.datatype)
+
+    complete = sum(1 for _, _, taxa in occupancy if taxa == len(supermatrix))
+    print(f"Supermatrix of {len(supermatrix)} taxa and {len(partitions)} loci ({complete} complete): {args.output}")
@@ -0,0 +1,146 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Collects the Snakemake benchmark files of a run into one resource usage table.
+
+Every rule in the Snakefile writes a benchmark file to <output_dir>/benchmarks/<rule>.tsv.
+A rule that reused a cached result instead of running its tool (pggb on a pggbcache hit) leaves a
+<rule>.cache_hit marker next to its benchmark file; those rows are flagged in the cache_hit column.
+This script finds all of them below a run directory (one output directory per community when
+sequence partitioning is used) and writes a MultiQC-compatible table with one row per community
+and rule.
+
+Usage:
+    python3 telemetry.py output/<runid> -o output/<runid>/telemetry/run_resource_usage.tsv
+"""
+
+import argparse
+import csv
+import glob
+import math
+import os
+
+# Snakemake benchmark column -> output column
+BENCHMARK_COLUMNS = {
+    's': 'wall_time_s',
+    'cpu_time': 'cpu_time_s',
+    'max_rss': 'max_rss_mb',
+    'io_in': 'io_in_mb',
+    'io_out': 'io_out_mb'
+}
+
+# Marker written next to the benchmark file of a rule that reused a cached result
+CACHE_HIT_SUFFIX = '.cache_hit'
+
+
+def read_benchmark(benchmark_path: str) -> dict:
+    """
+    Reads a Snakemake benchmark file. Rules that were benchmarked with repeats have
+    several rows; the mean of the rows is taken.
+
+    Args:
+        benchmark_path (str): Path to the benchmark TSV file.
+
+    Returns:
+        dict: The resource usage of the rule, keyed on the output column names. Values that
+              Snakemake could not measure are NaN.
+    """
+    totals = {column: 0.0 for column in BENCHMARK_COLUMNS.values()}
+    rows = 0
+    with open(benchmark_path) as f:
+        for row in csv.DictReader(f, delimiter='\t'):
+            rows += 1
+            for benchmark_column, column in BENCHMARK_COLUMNS.items():
+                try:
+                    totals[column] += float(row.get(benchmark_column, 'NA'))
+                except ValueError:  # Snakemake writes NA for unavailable measurements
+                    totals[column] = math.nan
+
+    return {column: value / rows if rows else math.nan for column, value in totals.items()}
+
+
+def collect_benchmarks(run_dir: str) -> list:
+    """
+    Finds and reads all benchmark files below a run directory.
+
+    Args:
+        run_dir (str): The output directory of a run, e.g. output/<runid>.
+
+    Returns:
+        list: A list of (community, rule, usage) tuples, sorted by community and rule. The community is the
+              output directory relative to the run directory, or the run directory name for unpartitioned runs.
+              usage['cache_hit'] is True if the rule reused a cached result.
+    """
+    run_dir = os.path.normpath(run_dir)
+    records = []
+    for benchmark_path in glob.glob(os.path.join(run_dir, '**', 'benchmarks', '*.tsv'), recursive=True):
+        community_dir = os.path.dirname(os.path.dirname(benchmark_path))
+        community = os.path.relpath(community_dir, run_dir)
+        if community == '.':
+            community = os.path.basename(run_dir)
+        rule = os.path.splitext(os.path.basename(benchmark_path))[0]
+        usage = read_benchmark(benchmark_path)
+        usage['cache_hit'] = os.path.exists(os.path.splitext(benchmark_path)[0] + CACHE_HIT_SUFFIX)
+        records.append((community, rule, usage))
+
+    return sorted(records, key=lambda record: (record[0], record[1]))
+
+
+def format_value(value: float) -> str:
+    """Formats a measurement for the table, leaving missing values empty."""
+    return '' if math.isnan(value) else f'{value:.2f}'
+
+
+def write_table(records: list, output_path: str):
+    """
+    Writes the resource usage table in the tab-separated format of MultiQC custom content tables.
+
+    Args:
+        records (list): (community, rule, usage) tuples from collect_benchmarks.
+        output_path (str): Path of the output TSV file.
+    """
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    columns = list(BENCHMARK_COLUMNS.values())
+    with open(output_path, 'w') as f:
+        f.write('\t'.join(['job', 'community', 'rule'] + columns + ['cache_hit']) + '\n')
+        for community, rule, usage in records:
+            values = [format_value(usage[column]) for column in columns] + ['yes' if usage['cache_hit'] else 'no']
+            f.write('\t'.join([f'{community}/{rule}', community, rule] + values) + '\n')
+
+
+def print_summary(records: list):
+    """
+    Prints the total wall time, CPU time and peak memory of every community.
+
+    Args:
+        records (list): (community, rule, usage) tuples from collect_benchmarks.
+    """
+    summary = {}
+    for community, _, usage in records:
+        wall, cpu, rss = summary.get(community, (0.0, 0.0, 0.0))
+        summary[community] = (wall + usage['wall_time_s'], cpu + usage['cpu_time_s'],
+                              max(rss, usage['max_rss_mb']) if not math.isnan(usage['max_rss_mb']) else rss)
+
+    for community, (wall, cpu, rss) in summary.items():
+        print(f"{community}: wall time {wall / 3600:.2f} h, CPU time {cpu / 3600:.2f} h, peak RSS {rss / 1024:.2f} GB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Collects Snakemake benchmark files into one resource usage table.")
+    parser.add_argument('run_dir', help="output directory of the run, e.g. output/<runid>")
+    parser.add_argument('-o', '--output', dest='output', required=True, help="output TSV file")
+    parser.add_argument('-q', '--quiet', dest='quiet', default=False, action='store_true', help="do not print the per-community summary")
+    args = parser.parse_args()
+
+    records = collect_benchmarks(args.run_dir)
+    write_table(records, args.output)
+
+    if not args.quiet:
+        print_summary(records)
+
+
+if __name__ == '__main__':
+    main()